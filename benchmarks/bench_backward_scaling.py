@@ -0,0 +1,73 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+"""Check that OpTreeBuilder.build_tree scales linearly with the number of layers of a model.
+
+    python benchmarks/bench_backward_scaling.py [--layers 1000 2000 5000 10000] [--repeat 3]
+
+Each synthetic model is one step of N nn.Module layers on the main thread, each running an aten::linear,
+and N autograd evaluate_function backward roots on the backward thread, associated by fwdbwd flows.
+The time per layer should stay flat as N grows.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cgs_dnn_analysis.profiler.node import ModuleNode, OperatorNode, ProfilerStepNode  # noqa: E402
+from cgs_dnn_analysis.profiler.op_tree import OpTreeBuilder  # noqa: E402
+from cgs_dnn_analysis.profiler.trace import EventTypes  # noqa: E402
+
+MAIN_TID, BACKWARD_TID = 1, 2
+
+
+def synthetic_model(layers: int):
+    """tid2list and fwd_bwd_map of a model with that many layers."""
+    backward_start = 10 * layers + 100
+    main = [ProfilerStepNode(name='ProfilerStep#0', start_time=0, end_time=backward_start + 10 * layers + 10,
+                             type=EventTypes.PROFILER_STEP, tid=MAIN_TID)]
+    backward = []
+    fwd_bwd_map = {}
+    for i in range(layers):
+        start = 10 * i + 1
+        main.append(ModuleNode(name=f'nn.Module: Linear_{i}', start_time=start, end_time=start + 8,
+                               type=EventTypes.MODULE, tid=MAIN_TID, module_id=i, python_id=i, python_parent_id=0))
+        main.append(OperatorNode(name='aten::linear', start_time=start + 1, end_time=start + 7,
+                                 type=EventTypes.OPERATOR, tid=MAIN_TID, external_id=i + 1))
+
+        bwd_start = backward_start + 10 * i + 1
+        backward.append(OperatorNode(name=OpTreeBuilder.BACKWARD_ROOT_PREFIX + ' AddmmBackward0',
+                                     start_time=bwd_start, end_time=bwd_start + 8, type=EventTypes.OPERATOR,
+                                     tid=BACKWARD_TID, external_id=layers + i + 1))
+        backward.append(OperatorNode(name='AddmmBackward0', start_time=bwd_start + 1, end_time=bwd_start + 7,
+                                     type=EventTypes.OPERATOR, tid=BACKWARD_TID, external_id=2 * layers + i + 1))
+        fwd_bwd_map[start + 1] = bwd_start + 1
+    return {MAIN_TID: main, BACKWARD_TID: backward}, fwd_bwd_map
+
+
+def run(layers: int, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        tid2list, fwd_bwd_map = synthetic_model(layers)
+        begin = time.perf_counter()
+        OpTreeBuilder().build_tree(tid2list, {}, [], fwd_bwd_map)
+        best = min(best, time.perf_counter() - begin)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layers', type=int, nargs='+', default=[1000, 2000, 5000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"layers":>8}{"build_tree s":>14}{"us/layer":>10}')
+    for layers in args.layers:
+        seconds = run(layers, args.repeat)
+        print(f'{layers:>8}{seconds:>14.3f}{seconds / layers * 1e6:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+"""Compare the JSON backends of cgs_dnn_analysis.json_codec on the log_api/*.json samples.
+
+    python benchmarks/bench_json.py [--repeat N] [--digits 3]
+
+Reports the best encode time, the payload size and the gzip payload size per sample and backend.
+The step keys of the samples are turned back into ints, as get_operator_tree produces them.
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cgs_dnn_analysis import json_codec  # noqa: E402
+
+
+def int_step_keys(obj):
+    if isinstance(obj, dict):
+        return {int(k) if k.isdigit() else k: v for k, v in obj.items()}
+    return obj
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--digits', type=int, default=3, help='float digits of the rounded variant')
+    args = parser.parse_args()
+
+    root = os.path.join(os.path.dirname(__file__), '..', 'log_api')
+    print(f'{"sample":<28}{"backend":<16}{"encode us":>12}{"bytes":>10}{"gzip bytes":>12}')
+    for path in sorted(glob.glob(os.path.join(root, '*.json'))):
+        with open(path) as f:
+            obj = int_step_keys(json.load(f))
+        variants = [('json.dumps', lambda: json.dumps(obj).encode('utf-8'))]
+        for name, encode in json_codec.BACKENDS.items():
+            variants.append((name, lambda encode=encode: encode(obj)))
+            variants.append((f'{name}+round{args.digits}',
+                             lambda encode=encode: encode(json_codec.round_floats(obj, args.digits))))
+
+        for name, encode in variants:
+            seconds = min(timeit.repeat(encode, number=args.repeat, repeat=5)) / args.repeat
+            body = encode()
+            print(f'{os.path.basename(path):<28}{name:<16}{seconds * 1e6:>12.1f}{len(body):>10}'
+                  f'{len(gzip.compress(body)):>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+"""Measure the per-instance memory of the profiler event and node classes.
+
+    python benchmarks/bench_node_memory.py [--count N]
+
+Every class is compared with a subclass of it without __slots__, which gets an instance __dict__ back;
+the event variants also keep the raw 'args' dict alive, as the events did before.
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cgs_dnn_analysis.profiler import node, trace  # noqa: E402
+
+KERNEL = {'ph': 'X', 'cat': 'kernel', 'name': 'volta_sgemm_128x64_nn', 'pid': 0, 'tid': 7, 'ts': 1000, 'dur': 20,
+          'args': {'external id': 11, 'correlation': 12, 'device': 0, 'stream': 7, 'registers per thread': 126,
+                   'shared memory': 12288, 'blocks per SM': 1.5, 'warps per SM': 6.0, 'grid': [16, 8, 1],
+                   'block': [256, 1, 1], 'est. achieved occupancy %': 12}}
+RUNTIME = {'ph': 'X', 'cat': 'cuda_runtime', 'name': 'cudaLaunchKernel', 'pid': 1, 'tid': 1, 'ts': 990, 'dur': 5,
+           'args': {'external id': 11, 'correlation': 12, 'cbid': 211}}
+OPERATOR = {'ph': 'X', 'cat': 'cpu_op', 'name': 'aten::addmm', 'pid': 1, 'tid': 1, 'ts': 980, 'dur': 30,
+            'args': {'External id': 11, 'Sequence number': 42, 'Fwd thread id': 0,
+                     'Input Dims': [[512], [64, 1024], [1024, 512], [], []],
+                     'Input type': ['float', 'float', 'float', 'Scalar', 'Scalar']}}
+MEMORY = {'ph': 'i', 'cat': 'cpu_instant_event', 'name': '[memory]', 'pid': 1, 'tid': 1, 'ts': 985, 's': 't',
+          'args': {'Device Type': 1, 'Device Id': 0, 'Addr': 140000000, 'Bytes': 2097152,
+                   'Total Allocated': 4194304, 'Total Reserved': 20971520}}
+
+
+def _with_dict(cls):
+    return type(cls.__name__, (cls,), {})
+
+
+def _event_factories():
+    def event(cls, data, *type_arg):
+        dict_cls = _with_dict(cls)
+
+        def slotted():
+            return cls(*type_arg, data)
+
+        def with_dict():
+            e = dict_cls(*type_arg, data)
+            e.args = dict(data['args'])
+            return e
+        return slotted, with_dict
+
+    return {
+        'KernelEvent': event(trace.KernelEvent, KERNEL, trace.EventTypes.KERNEL),
+        'DurationEvent': event(trace.DurationEvent, RUNTIME, trace.EventTypes.RUNTIME),
+        'OperatorEvent': event(trace.OperatorEvent, OPERATOR, trace.EventTypes.OPERATOR),
+        'MemoryEvent': event(trace.MemoryEvent, MEMORY, trace.EventTypes.MEMORY),
+    }
+
+
+def _node_factories():
+    kernel = trace.KernelEvent(trace.EventTypes.KERNEL, KERNEL)
+    runtime = trace.DurationEvent(trace.EventTypes.RUNTIME, RUNTIME)
+    operator = trace.OperatorEvent(trace.EventTypes.OPERATOR, OPERATOR)
+
+    def device(cls):
+        return lambda: cls.create(kernel)
+
+    def runtime_node(cls):
+        return lambda: cls.create(runtime, None)
+
+    def operator_node(cls):
+        return lambda: cls.create(operator)
+
+    return {
+        'DeviceNode': (device(node.DeviceNode), device(_with_dict(node.DeviceNode))),
+        'RuntimeNode': (runtime_node(node.RuntimeNode), runtime_node(_with_dict(node.RuntimeNode))),
+        'OperatorNode': (operator_node(node.OperatorNode), operator_node(_with_dict(node.OperatorNode))),
+    }
+
+
+def measure(factory, count: int) -> float:
+    """Bytes allocated per instance, the instances being kept alive."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [factory() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del instances
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f'{"class":<16}{"__dict__ bytes":>16}{"__slots__ bytes":>17}{"saving":>10}')
+    for name, (slotted, with_dict) in {**_event_factories(), **_node_factories()}.items():
+        old, new = measure(with_dict, args.count), measure(slotted, args.count)
+        print(f'{name:<16}{old:>16.0f}{new:>17.0f}{old / new:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+"""Aggregates of the communication durations of the /communication_timing route.
+
+The durations of every collective (broadcast_<i> of the steps, all_reduce_<i> of the backward passes, as
+classified by the matcher profile of the run) are summarized once per worker when the run is received,
+into mergeable DurationStats. A run is the merge of its workers, so a request costs
+O(#runs x #collectives) however many steps were captured.
+"""
+import math
+from typing import Any, Dict, Iterable, Optional
+
+from .matchers import DEFAULT_MATCHER, OperationMatcher
+
+__all__ = ['DurationStats', 'QuantileSketch', 'collect_communication_stats', 'merge_stats', 'STATISTICS']
+
+# the statistics /communication_timing can return with ?stat=
+STATISTICS = ('mean', 'std', 'min', 'max', 'count', 'p50', 'p95', 'p99')
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch of positive values with a bounded relative error (DDSketch).
+
+    Values are counted in logarithmic buckets [gamma^(i-1), gamma^i), so any quantile is estimated within
+    relative_accuracy of a value of the sample, and two sketches merge by adding the bucket counts.
+    """
+
+    __slots__ = ['gamma', 'buckets', 'count']
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+
+    def add(self, value: float):
+        index = math.ceil(math.log(value, self.gamma))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+
+    def merge(self, other: 'QuantileSketch'):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                break
+        # the middle of the bucket in relative terms
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+
+class DurationStats:
+    """count, sum, sum of squares, min, max and a QuantileSketch of the durations of one collective."""
+
+    __slots__ = ['count', 'total', 'total_sq', 'min', 'max', 'sketch']
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+
+    def merge(self, other: 'DurationStats'):
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+
+    def value(self, stat: str) -> Optional[float]:
+        if not self.count:
+            return None
+        if stat == 'mean':
+            return self.total / self.count
+        if stat == 'std':
+            mean = self.total / self.count
+            return math.sqrt(max(self.total_sq / self.count - mean * mean, 0.0))
+        if stat in ('min', 'max', 'count'):
+            return getattr(self, stat)
+        if stat.startswith('p'):
+            # the sketch estimate never leaves the observed range
+            return min(max(self.sketch.quantile(int(stat[1:]) / 100), self.min), self.max)
+        raise ValueError(f'unknown statistic {stat}')
+
+    def to_dict(self, digits: int = 4) -> Dict[str, Any]:
+        return {stat: round(self.value(stat), digits) for stat in STATISTICS}
+
+
+def collect_communication_stats(steps: Dict[Any, Dict[str, Any]],
+                                matcher: OperationMatcher = DEFAULT_MATCHER) -> Dict[str, DurationStats]:
+    """The stats of the collectives of one worker, from the step data of get_operator_tree.
+
+    The backward collectives are the ones the matcher of the run classifies as allreduce, like
+    filter_backward_data does, e.g. the reduce_scatter calls of FSDP.
+    The keys are in the order the collectives are first seen, which is the column order of the table.
+    Only the positive durations are counted, a collective may have none.
+    """
+    stats: Dict[str, DurationStats] = {}
+
+    def add(key: str, duration):
+        if key not in stats:
+            stats[key] = DurationStats()
+        if duration > 0:
+            stats[key].add(duration)
+
+    for step_content in steps.values():
+        for i, event in enumerate(step_content.get('broadcasts', [])):
+            add(f'broadcast_{i}', event.get('end_time', 0) - event.get('start_time', 0))
+
+        # the allreduce collectives are numbered in pre-order of the backward trees
+        all_reduce_counter = 0
+        stack = list(reversed(step_content.get('backward', [])))
+        while stack:
+            event = stack.pop()
+            children = event.get('children', [])
+            for child in children:
+                if matcher.kind(child.get('name')) == 'allreduce':
+                    add(f'all_reduce_{all_reduce_counter}', child.get('dur', 0))
+                    all_reduce_counter += 1
+            stack.extend(reversed(children))
+    return stats
+
+
+def merge_stats(parts: Iterable[Dict[str, DurationStats]]) -> Dict[str, DurationStats]:
+    merged: Dict[str, DurationStats] = {}
+    for part in parts:
+        for key, stats in part.items():
+            if key not in merged:
+                merged[key] = DurationStats()
+            merged[key].merge(stats)
+    return merged
@@ -0,0 +1,429 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+"""Discovery of the run directories (the directories holding trace files) of the logdir.
+
+Instead of walking the whole logdir every few seconds:
+* local logdirs are watched with inotify, only the directories reported as changed are listed again;
+* remote logdirs are listed in one flat listing, incrementally after the last listed path where the
+  storage supports it (S3, GCS), and the listing is persisted next to the profile cache so a restart
+  resumes from it. A full listing still runs every full_scan_interval to see the out of order changes;
+* the polling interval doubles up to max_interval while nothing changes.
+"""
+import abc
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import consts, io, utils
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    INOTIFY_ENABLED = sys.platform.startswith('linux') and hasattr(_libc, 'inotify_init1')
+except (OSError, TypeError):
+    INOTIFY_ENABLED = False
+
+__all__ = ['RunDiscovery', 'PollingDiscovery', 'InotifyDiscovery']
+
+logger = utils.get_logger()
+
+DEFAULT_MAX_INTERVAL = 300
+DEFAULT_FULL_SCAN_INTERVAL = 600
+
+# run directory -> trace file name -> StatData, None when the listing does not return it
+RunFiles = Dict[str, Dict[str, Optional[io.StatData]]]
+
+
+class Backoff:
+    """Polling interval which doubles from base up to maximum while nothing changes."""
+
+    def __init__(self, base: float, maximum: float):
+        self.base = base
+        self.maximum = max(base, maximum)
+        self.interval = base
+
+    def update(self, changed: bool):
+        self.interval = self.base if changed else min(self.interval * 2, self.maximum)
+
+
+class RunDiscovery(abc.ABC):
+    """Tracks the trace files of a logdir, see the module docstring.
+
+    The monitor thread alternates scan(), which returns the current run directories, and wait().
+    """
+
+    def __init__(self, logdir: str, base_interval: float = consts.MONITOR_RUN_REFRESH_INTERNAL_IN_SECONDS,
+                 max_interval: float = DEFAULT_MAX_INTERVAL,
+                 full_scan_interval: float = DEFAULT_FULL_SCAN_INTERVAL):
+        self.logdir = logdir
+        self.backoff = Backoff(base_interval, max_interval)
+        self.full_scan_interval = full_scan_interval
+        self._runs: RunFiles = {}
+
+    @staticmethod
+    def from_env(logdir: str, cache_dir: Optional[str] = None) -> 'RunDiscovery':
+        """Create the discovery of the logdir, configured by
+        - TORCH_PROFILER_DISCOVERY: auto (inotify for local logdirs where available) or poll,
+        - TORCH_PROFILER_DISCOVERY_MAX_INTERVAL: the longest polling interval in seconds,
+        - TORCH_PROFILER_DISCOVERY_FULL_SCAN_INTERVAL: seconds between the full listings.
+        The listing of remote logdirs is persisted in cache_dir."""
+        mode = os.environ.get('TORCH_PROFILER_DISCOVERY', 'auto')
+        kwargs = {
+            'max_interval': float(os.environ.get('TORCH_PROFILER_DISCOVERY_MAX_INTERVAL', DEFAULT_MAX_INTERVAL)),
+            'full_scan_interval': float(os.environ.get('TORCH_PROFILER_DISCOVERY_FULL_SCAN_INTERVAL',
+                                                       DEFAULT_FULL_SCAN_INTERVAL)),
+        }
+        if io.is_local(logdir):
+            if mode != 'poll' and INOTIFY_ENABLED and os.path.isdir(logdir):
+                try:
+                    return InotifyDiscovery(logdir, **kwargs)
+                except OSError as ex:
+                    logger.warning('Failed to watch %s with inotify, polling it. Exception=%s', logdir, ex)
+            return PollingDiscovery(logdir, **kwargs)
+
+        listing_path = None
+        if cache_dir:
+            digest = hashlib.sha1(logdir.encode('utf-8')).hexdigest()
+            listing_path = os.path.join(cache_dir, 'listing-{}.json'.format(digest))
+        return PollingDiscovery(logdir, listing_path=listing_path, **kwargs)
+
+    @abc.abstractmethod
+    def scan(self) -> RunFiles:
+        pass
+
+    @abc.abstractmethod
+    def wait(self):
+        pass
+
+    def fallback(self) -> 'RunDiscovery':
+        """The discovery to continue with after wait() failed."""
+        return self
+
+    def close(self):
+        pass
+
+    def _update(self, runs: RunFiles) -> bool:
+        """Replace the runs, return whether anything changed."""
+        changed = runs != self._runs
+        self._runs = runs
+        return changed
+
+    @staticmethod
+    def _trace_files(files: Dict[str, Optional[io.StatData]], split) -> RunFiles:
+        runs: RunFiles = {}
+        for path, stat in files.items():
+            run_dir, name = split(path)
+            if utils.is_chrome_trace_file(name):
+                runs.setdefault(run_dir, {})[name] = stat
+        return runs
+
+
+class PollingDiscovery(RunDiscovery):
+    """Lists the logdir with io.list_files at the interval of the backoff."""
+
+    def __init__(self, logdir: str, listing_path: Optional[str] = None, **kwargs):
+        super().__init__(logdir, **kwargs)
+        self.listing_path = listing_path
+        self._local = io.is_local(logdir)
+        self._incremental = not self._local and io.supports_start_after(logdir)
+        # path -> StatData of the trace files, and the greatest listed path
+        self._files: Dict[str, Optional[io.StatData]] = {}
+        self._marker: Optional[str] = None
+        self._last_full_scan = 0.0
+        self._load_listing()
+
+    def scan(self) -> RunFiles:
+        full = not self._incremental or self._marker is None or \
+            time.monotonic() - self._last_full_scan >= self.full_scan_interval
+        marker = None if full else self._marker
+        files = {} if full else dict(self._files)
+        listed = 0
+        for path, stat in io.list_files(self.logdir, marker):
+            listed += 1
+            if marker is None or path > marker:
+                marker = path
+            if utils.is_chrome_trace_file(self._split(path)[1]):
+                files[path] = stat
+        if full:
+            self._last_full_scan = time.monotonic()
+        logger.debug('Listed %d files of %s, %s listing', listed, self.logdir, 'full' if full else 'incremental')
+
+        changed = self._update(self._trace_files(files, self._split))
+        self.backoff.update(changed)
+        if changed or marker != self._marker:
+            self._files, self._marker = files, marker
+            self._save_listing()
+        return self._runs
+
+    def wait(self):
+        time.sleep(self.backoff.interval)
+
+    def _split(self, path: str) -> Tuple[str, str]:
+        if self._local:
+            return os.path.split(path)
+        index = path.rfind('/')
+        return path[:index], path[index + 1:]
+
+    def _load_listing(self):
+        if not self.listing_path or not self._incremental:
+            return
+        try:
+            with open(self.listing_path, 'r', encoding='utf-8') as f:
+                listing = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as ex:
+            logger.warning('Failed to read the listing cache %s. Exception=%s', self.listing_path, ex)
+            return
+        if listing.get('logdir') != self.logdir:
+            return
+        self._files = {path: io.StatData(*stat) if stat is not None else None
+                       for path, stat in listing['files'].items()}
+        self._marker = listing['marker']
+        # the persisted listing is as good as a full one, so the next scans only list the new paths
+        self._last_full_scan = time.monotonic()
+        logger.info('Resume the listing of %s after %s', self.logdir, self._marker)
+
+    def _save_listing(self):
+        if not self.listing_path or not self._incremental:
+            return
+        listing = {'logdir': self.logdir, 'marker': self._marker,
+                   'files': {path: list(stat) if stat is not None else None for path, stat in self._files.items()}}
+        try:
+            cache_dir = os.path.dirname(self.listing_path)
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(listing, f)
+            os.replace(temp_path, self.listing_path)
+        except Exception as ex:
+            logger.warning('Failed to write the listing cache %s. Exception=%s', self.listing_path, ex)
+
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | \
+    IN_MOVE_SELF | IN_ONLYDIR
+_EVENT = struct.Struct('iIII')
+
+
+class _Inotify:
+    """Minimal ctypes binding of the Linux inotify API."""
+
+    def __init__(self):
+        self.fd = _libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def read(self, timeout: Optional[float]) -> List[Tuple[int, int, str]]:
+        """The pending (watch descriptor, mask, name) events, waiting up to timeout seconds for the first."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        events = []
+        while readable:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                events.append((wd, mask, os.fsdecode(data[offset:offset + length].rstrip(b'\0'))))
+                offset += length
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class InotifyDiscovery(RunDiscovery):
+    """Watches every directory of a local logdir with inotify.
+
+    wait() blocks until a change is reported (or full_scan_interval passes), and scan() then lists only
+    the directories reported as changed. The trace files are taken once they are closed after writing or
+    moved in. A full walk is done again when the event queue overflows. The directories which cannot be
+    watched, e.g. beyond fs.inotify.max_user_watches, are listed again at the interval of the backoff.
+    """
+
+    # how long to keep collecting the events of a burst, e.g. all the ranks writing their traces
+    SETTLE_SECONDS = 1.0
+
+    def __init__(self, logdir: str, **kwargs):
+        super().__init__(logdir, **kwargs)
+        self._inotify = _Inotify()
+        self._watches: Dict[int, str] = {}
+        self._dirty: set = set()
+        self._full = False
+        # the directories without a watch, polled instead, and those already logged
+        self._unwatched: set = set()
+        self._reported: set = set()
+        self._files: Dict[str, Dict[str, io.StatData]] = {}
+        self._watch_tree(logdir, self._files)
+        self._last_full_scan = time.monotonic()
+        if logdir in self._unwatched:
+            # fails early when the logdir itself cannot be watched, from_env polls it then
+            self._inotify.close()
+            raise OSError(f'could not watch {logdir}')
+
+    def scan(self) -> RunFiles:
+        if self._full:
+            self._full = False
+            self._unwatched.clear()
+            self._dirty.clear()
+            self._files = {}
+            self._watch_tree(self.logdir, self._files)
+            self._last_full_scan = time.monotonic()
+        else:
+            if self._unwatched:
+                self._poll_unwatched()
+            for directory in self._dirty:
+                files = self._list_dir(directory)
+                if files:
+                    self._files[directory] = files
+                else:
+                    self._files.pop(directory, None)
+            self._dirty.clear()
+        self._reported &= self._unwatched
+        self.backoff.update(self._update({d: dict(files) for d, files in self._files.items()}))
+        return self._runs
+
+    def wait(self):
+        events = self._inotify.read(self.backoff.interval if self._unwatched else self.full_scan_interval)
+        if not events:
+            # nothing reported for full_scan_interval, walk again in case events were missed
+            if time.monotonic() - self._last_full_scan >= self.full_scan_interval:
+                self._full = True
+            return
+        deadline = time.monotonic() + self.SETTLE_SECONDS
+        while True:
+            self._handle(events)
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            events = self._inotify.read(timeout)
+
+    def fallback(self) -> RunDiscovery:
+        logger.warning('Stop watching %s with inotify, poll it instead', self.logdir)
+        self.close()
+        return PollingDiscovery(self.logdir, base_interval=self.backoff.base, max_interval=self.backoff.maximum,
+                                full_scan_interval=self.full_scan_interval)
+
+    def close(self):
+        self._inotify.close()
+
+    def _handle(self, events: List[Tuple[int, int, str]]):
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                logger.info('inotify queue of %s overflowed, walk it again', self.logdir)
+                self._full = True
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._watches[wd]
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._dirty.update(self._watch_tree(path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._dirty.update(d for d in self._files if d == path or d.startswith(path + os.sep))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM) and \
+                    utils.is_chrome_trace_file(name):
+                self._dirty.add(directory)
+
+    def _poll_unwatched(self):
+        """List the directories without a watch again, and retry their watches."""
+        unwatched, self._unwatched = self._unwatched, set()
+        known = set(self._watches.values()) | unwatched
+        for directory in unwatched:
+            if not self._watch_dir(directory):
+                self._files.pop(directory, None)
+                continue
+            self._dirty.add(directory)
+            # no event reports the subdirectories created since
+            try:
+                with os.scandir(directory) as it:
+                    subdirectories = [entry.path for entry in it if entry.is_dir()]
+            except OSError:
+                continue
+            for subdirectory in subdirectories:
+                if subdirectory not in known:
+                    self._dirty.update(self._watch_tree(subdirectory))
+
+    def _watch_dir(self, directory: str) -> bool:
+        """Watch the directory, or poll it when it cannot be watched. False when it does not exist."""
+        try:
+            self._watches[self._inotify.add_watch(directory, _WATCH_MASK)] = directory
+        except OSError as ex:
+            if ex.errno in (errno.ENOENT, errno.ENOTDIR):
+                return False
+            if directory not in self._reported:
+                logger.warning('Failed to watch %s, poll it instead. Exception=%s', directory, ex)
+                self._reported.add(directory)
+            self._unwatched.add(directory)
+        return True
+
+    def _watch_tree(self, top: str, files: Optional[Dict[str, Dict[str, io.StatData]]] = None) -> List[str]:
+        """Watch top and its subdirectories, list their trace files into files. Return the directories."""
+        directories = []
+        for root, _, names in os.walk(top, followlinks=True):
+            if not self._watch_dir(root):
+                # removed between the walk and the watch
+                continue
+            directories.append(root)
+            if files is not None and any(utils.is_chrome_trace_file(name) for name in names):
+                listed = self._list_dir(root)
+                if listed:
+                    files[root] = listed
+        return directories
+
+    @staticmethod
+    def _list_dir(directory: str) -> Dict[str, io.StatData]:
+        files = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not utils.is_chrome_trace_file(entry.name):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if not entry.is_dir():
+                        files[entry.name] = io.StatData(st.st_size, str(st.st_mtime_ns))
+        except OSError:
+            pass
+        return files
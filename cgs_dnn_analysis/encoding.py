@@ -0,0 +1,95 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+"""Content-Encoding negotiation and compression of the json responses."""
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional, Tuple
+
+try:
+    # pyre-fixme[21]: Could not find module `brotli`.
+    import brotli
+    BROTLI_ENABLED = True
+except ImportError:
+    BROTLI_ENABLED = False
+
+__all__ = ['negotiate_encoding', 'compress', 'compress_stream', 'BodyCache']
+
+IDENTITY = 'identity'
+# bodies smaller than this are sent as is, compressing them does not pay off
+MIN_COMPRESS_SIZE = 1024
+
+
+def negotiate_encoding(accept_encodings) -> str:
+    """Pick br, gzip or identity from the werkzeug Accept object of the Accept-Encoding header."""
+    candidates = ['br', 'gzip'] if BROTLI_ENABLED else ['gzip']
+    best = accept_encodings.best_match(candidates)
+    return best or IDENTITY
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress the chunks of a streamed body incrementally, with the same settings as compress."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            out = compressor.process(chunk)
+            if out:
+                yield out
+        yield compressor.finish()
+    elif encoding == 'gzip':
+        # wbits 16 + 15 writes the gzip header and trailer
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                yield out
+        yield compressor.flush()
+    else:
+        yield from chunks
+
+
+class BodyCache:
+    """Small LRU of the encoded response bodies keyed by their strong ETag.
+
+    The ETag covers the data version, the query and the encoding, so an entry never goes stale
+    and repeated view switches in the browser skip both serialization and compression.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, etag: str) -> Optional[Tuple[bytes, str]]:
+        """Return (body, content encoding) or None."""
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, etag: str, body: bytes, encoding: str):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(etag, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[etag] = (body, encoding)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
@@ -1,5 +1,5 @@
 # pyre-unsafe
 from .cache import Cache
-from .file import (BaseFileSystem, StatData, abspath, basename, download_file,
-                   exists, get_filesystem, glob, isdir, join, listdir,
-                   makedirs, read, register_filesystem, relpath, walk)
+from .file import (BaseFileSystem, File, StatData, abspath, basename, download_file,
+                   exists, get_filesystem, glob, is_local, isdir, join, list_files, listdir,
+                   makedirs, read, register_filesystem, relpath, stat, supports_start_after, walk)
@@ -135,7 +135,7 @@ class AzureBlobSystem(RemotePath, BaseFileSystem):
         client = self.create_container_client(account, container)
         blob_client = client.get_blob_client(path)
         props = blob_client.get_blob_properties()
-        return StatData(props.size)
+        return StatData(props.size, props.etag)
 
     def walk(self, top, topdown=True, onerror=None):
         account, container, path = self.container_and_path(top)
@@ -149,6 +149,15 @@ class AzureBlobSystem(RemotePath, BaseFileSystem):
         for key, value in results.items():
             yield key, None, value
 
+    def list_files(self, top, start_after=None):
+        # list_blobs cannot start after a given name, the whole prefix is listed in one flat listing
+        account, container, path = self.container_and_path(top)
+        if path and not path.endswith('/'):
+            path += '/'
+        client = self.create_container_client(account, container)
+        for blob in client.list_blobs(name_starts_with=path):
+            yield 'https://{}/{}/{}'.format(account, container, blob.name), StatData(blob.size, blob.etag)
+
     def split_blob_path(self, blob_path):
         """ Find the first blob start with blob_path, then get the relative path starting from dirname(blob_path).
         Finally, split the relative path.
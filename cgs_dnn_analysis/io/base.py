@@ -8,13 +8,29 @@ from abc import ABC, abstractmethod
 from collections import namedtuple
 
 # Data returned from the Stat call.
-StatData = namedtuple('StatData', ['length'])
+# version is an opaque token (mtime, etag, ...) that changes whenever the content changes.
+StatData = namedtuple('StatData', ['length', 'version'], defaults=(None,))
 
 
 class BaseFileSystem(ABC):
+    # whether list_files can resume a listing after a given path, e.g. S3 StartAfter
+    supports_start_after = False
+
     def support_append(self):
         return False
 
+    def list_files(self, top, start_after=None):
+        """Yield (path, StatData) of every file under top, recursively.
+
+        When supports_start_after, the files are listed in lexicographic order of the path and only those
+        after start_after are yielded, otherwise start_after is ignored. The StatData comes with the listing
+        where the storage returns it; this default implementation walks the tree and yields None instead.
+        """
+        from .file import walk
+        for root, _, files in walk(top):
+            for file in files:
+                yield self.join(root, file), None
+
     def append(self, filename, file_content, binary_mode=False):
         pass
 
@@ -168,8 +168,8 @@ class LocalFileSystem(LocalPath, BaseFileSystem):
         """Returns file statistics for a given path."""
         # NOTE: Size of the file is given by .st_size as returned from
         # os.stat(), but we convert to .length
-        file_length = os.stat(filename).st_size
-        return StatData(file_length)
+        st = os.stat(filename)
+        return StatData(st.st_size, str(st.st_mtime_ns))
 
     def walk(self, top, topdown=True, onerror=None):
         # Note on followlinks=True: per the tensorboard documentation [1], users are encouraged to
@@ -178,10 +178,22 @@ class LocalFileSystem(LocalPath, BaseFileSystem):
         # [1] https://github.com/tensorflow/tensorboard/blob/master/README.md#logdir--logdir_spec-legacy-mode
         yield from os.walk(top, topdown, onerror, followlinks=True)
 
+    def list_files(self, top, start_after=None):
+        for root, _, files in self.walk(top):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # removed during the walk
+                yield path, StatData(st.st_size, str(st.st_mtime_ns))
+
 
 class S3FileSystem(RemotePath, BaseFileSystem):
     """Provides filesystem access to S3."""
 
+    supports_start_after = True
+
     def __init__(self):
         if not boto3:
             raise ImportError("boto3 must be installed for S3 support.")
@@ -349,7 +361,22 @@ class S3FileSystem(RemotePath, BaseFileSystem):
         bucket, path = self.bucket_and_path(filename)
 
         obj = client.head_object(Bucket=bucket, Key=path)
-        return StatData(obj["ContentLength"])
+        return StatData(obj["ContentLength"], obj.get("ETag"))
+
+    def list_files(self, top, start_after=None):
+        """Lists the objects under top in pages of 1000 keys, from start_after on if given."""
+        client = boto3.client("s3", endpoint_url=self._s3_endpoint)
+        bucket, path = self.bucket_and_path(top)
+        if path and not path.endswith("/"):
+            path += "/"
+        args = {"Bucket": bucket, "Prefix": path}
+        if start_after:
+            args["StartAfter"] = self.bucket_and_path(start_after)[1]
+        p = client.get_paginator("list_objects_v2")
+        for r in p.paginate(**args):
+            for o in r.get("Contents", []):
+                if not o["Key"].endswith("/"):
+                    yield "s3://{}/{}".format(bucket, o["Key"]), StatData(o["Size"], o.get("ETag"))
 
 
 register_filesystem("", LocalFileSystem())
@@ -633,6 +660,16 @@ def stat(filename):
     return get_filesystem(filename).stat(filename)
 
 
+def list_files(top, start_after=None):
+    """Yields (path, StatData or None) of every file under top, see BaseFileSystem.list_files."""
+    return get_filesystem(top).list_files(top, start_after)
+
+
+def supports_start_after(path):
+    """Returns whether list_files of the filesystem of the path can resume after a given path."""
+    return get_filesystem(path).supports_start_after
+
+
 def read(file):
     with File(file, 'rb') as f:
         return f.read()
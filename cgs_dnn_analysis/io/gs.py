@@ -17,6 +17,8 @@ logger = utils.get_logger()
 class GoogleBlobSystem(RemotePath, BaseFileSystem):
     """Provides filesystem access to S3."""
 
+    supports_start_after = True
+
     def __init__(self):
         if not storage:
             raise ImportError('google-cloud-storage must be installed for Google Cloud Blob support.')
@@ -77,7 +79,7 @@ class GoogleBlobSystem(RemotePath, BaseFileSystem):
         client = self.create_google_cloud_client()
         bucket = client.bucket(bucket_name)
         blob = bucket.get_blob(path)
-        return StatData(blob.size)
+        return StatData(blob.size, blob.etag)
 
     def walk(self, top, topdown=True, onerror=None):
         bucket_name, path = self.bucket_and_path(top)
@@ -91,6 +93,18 @@ class GoogleBlobSystem(RemotePath, BaseFileSystem):
         for key, value in results.items():
             yield key, None, value
 
+    def list_files(self, top, start_after=None):
+        bucket_name, path = self.bucket_and_path(top)
+        if path and not path.endswith('/'):
+            path += '/'
+        client = self.create_google_cloud_client()
+        start_offset = self.bucket_and_path(start_after)[1] if start_after else None
+        for blob in client.list_blobs(bucket_name, prefix=path, start_offset=start_offset):
+            # start_offset is inclusive
+            if blob.name == start_offset or blob.name.endswith('/'):
+                continue
+            yield 'gs://{}/{}'.format(bucket_name, blob.name), StatData(blob.size, blob.etag)
+
     def split_blob_path(self, blob_path):
         """ Find the first blob start with blob_path, then get the relative path starting from dirname(blob_path).
         Finally, split the relative path.
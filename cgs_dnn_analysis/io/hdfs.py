@@ -63,8 +63,17 @@ class HadoopFileSystem(RemotePath, BaseFileSystem):
     
     def stat(self, filename):
         stat = self.get_fs().stat(filename)
-        return StatData(stat['size'])
+        mtime = stat.get('mtime')
+        return StatData(stat['size'], str(mtime) if mtime is not None else None)
     
+    def list_files(self, top, start_after=None):
+        fs = self.get_fs()
+        root_path_to_strip = fs._strip_protocol(top)
+        for path, info in fs.find(top, detail=True).items():
+            mtime = info.get('mtime')
+            yield (self.join(top, os.path.relpath(path, root_path_to_strip)),
+                   StatData(info['size'], str(mtime) if mtime is not None else None))
+
     def support_append(self):
         return False
     
@@ -0,0 +1,93 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+"""JSON encoding of the plugin responses.
+
+orjson or ujson is used when installed, falling back to the standard json module. The backend can be
+forced with TORCH_PROFILER_JSON_BACKEND (orjson, ujson or json). Setting TORCH_PROFILER_JSON_FLOAT_DIGITS
+rounds every float to that many decimal digits to shrink the payloads.
+"""
+import json
+import os
+from typing import Any, Callable, Dict, Optional
+
+from . import utils
+
+try:
+    # pyre-fixme[21]: Could not find module `orjson`.
+    import orjson
+    ORJSON_ENABLED = True
+except ImportError:
+    ORJSON_ENABLED = False
+
+try:
+    # pyre-fixme[21]: Could not find module `ujson`.
+    import ujson
+    UJSON_ENABLED = True
+except ImportError:
+    UJSON_ENABLED = False
+
+__all__ = ['dumps', 'BACKENDS', 'BACKEND']
+
+logger = utils.get_logger()
+
+
+def _orjson_dumps(obj) -> bytes:
+    # the steps of get_operator_tree are keyed by int
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _ujson_dumps(obj) -> bytes:
+    return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+# backend name -> encoder of an object to utf-8 json bytes, in the order of preference
+BACKENDS: Dict[str, Callable[[Any], bytes]] = {}
+if ORJSON_ENABLED:
+    BACKENDS['orjson'] = _orjson_dumps
+if UJSON_ENABLED:
+    BACKENDS['ujson'] = _ujson_dumps
+BACKENDS['json'] = _json_dumps
+
+
+def _select_backend() -> str:
+    name = os.environ.get('TORCH_PROFILER_JSON_BACKEND')
+    if name:
+        if name in BACKENDS:
+            return name
+        logger.warning('JSON backend %s is not available, choose one of %s', name, list(BACKENDS))
+    return next(iter(BACKENDS))
+
+
+def _float_digits() -> Optional[int]:
+    digits = os.environ.get('TORCH_PROFILER_JSON_FLOAT_DIGITS')
+    return int(digits) if digits else None
+
+
+BACKEND = _select_backend()
+FLOAT_DIGITS = _float_digits()
+_dumps = BACKENDS[BACKEND]
+
+
+def round_floats(obj, ndigits: int):
+    """Copy of obj with every float rounded to ndigits decimal digits."""
+    if isinstance(obj, float):
+        return round(obj, ndigits)
+    if isinstance(obj, dict):
+        return {k: round_floats(v, ndigits) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [round_floats(v, ndigits) for v in obj]
+    return obj
+
+
+def dumps(obj, float_digits: Optional[int] = FLOAT_DIGITS) -> bytes:
+    """Encode obj to compact json bytes. Non-str keys such as the int steps are encoded as strings."""
+    if float_digits is not None:
+        obj = round_floats(obj, float_digits)
+    return _dumps(obj)
@@ -0,0 +1,147 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+"""Matcher profiles which classify operator names into the step operations
+(forward, loss, backward, optimizer, broadcast, allreduce).
+
+A profile is declared as operation kind -> {'exact': [...], 'prefix': [...], 'regex': [...]}.
+Regexes are matched from the start of the name. Exact names win over prefixes, and prefixes over
+regexes. The default profile is chosen by TORCH_PROFILER_MATCHER_PROFILE, either a built-in
+profile name or the path of a json profile, and a run can override it with a matcher_profile.json
+file in its directory, e.g. {"base": "fsdp", "operations": {"loss": {"exact": ["aten::my_loss"]}}}.
+The rules of a profile file are added to those of its base, so this one also keeps the built-in losses.
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+from . import io, utils
+
+__all__ = ['OperationMatcher', 'BUILTIN_PROFILES', 'DEFAULT_MATCHER', 'get_matcher', 'load_run_matcher']
+
+logger = utils.get_logger()
+
+RUN_PROFILE_FILE = 'matcher_profile.json'
+DEFAULT_PROFILE = 'ddp'
+_MAX_MEMO_SIZE = 1 << 16
+
+OPERATION_KINDS = ('forward', 'loss', 'backward', 'optimizer', 'broadcast', 'allreduce')
+
+_LOSSES = {
+    'exact': [
+        'aten::cross_entropy_loss', 'aten::nll_loss', 'aten::nll_loss_nd', 'aten::mse_loss', 'aten::l1_loss',
+        'aten::smooth_l1_loss', 'aten::huber_loss', 'aten::binary_cross_entropy',
+        'aten::binary_cross_entropy_with_logits', 'aten::kl_div', 'aten::ctc_loss',
+    ],
+}
+# Optimizer.step#SGD.step, Optimizer.step#AdamW.step, ...
+_OPTIMIZERS = {'prefix': ['Optimizer.step#']}
+
+BUILTIN_PROFILES: Dict[str, Dict[str, Dict[str, List[str]]]] = {
+    'ddp': {
+        'forward': {'regex': [r'nn\.Module: DistributedDataParallel_\d+$']},
+        'loss': _LOSSES,
+        'backward': {'regex': [r'nn\.Module: DistributedDataParallel_\d+\.backward$']},
+        'optimizer': _OPTIMIZERS,
+        'broadcast': {'exact': ['nccl:broadcast']},
+        'allreduce': {'exact': ['nccl:all_reduce']},
+    },
+    'fsdp': {
+        'forward': {'regex': [r'nn\.Module: FullyShardedDataParallel_\d+$']},
+        'loss': _LOSSES,
+        'backward': {'regex': [r'nn\.Module: FullyShardedDataParallel_\d+\.backward$']},
+        'optimizer': _OPTIMIZERS,
+        # FSDP gathers the parameters before the forward and reduce-scatters the gradients in the backward
+        'broadcast': {'exact': ['nccl:broadcast', 'nccl:all_gather', 'nccl:_all_gather_base',
+                                'nccl:all_gather_into_tensor_coalesced']},
+        'allreduce': {'exact': ['nccl:all_reduce', 'nccl:reduce_scatter', 'nccl:_reduce_scatter_base',
+                                'nccl:reduce_scatter_tensor_coalesced']},
+    },
+}
+
+
+class OperationMatcher:
+    """A profile compiled into an exact-name table and one combined regex of the prefixes and regexes.
+    Results are memoized per name, so the repeated operator names cost a single dict lookup."""
+
+    def __init__(self, name: str, operations: Dict[str, Dict[str, List[str]]]):
+        unknown = set(operations) - set(OPERATION_KINDS)
+        if unknown:
+            raise ValueError(f'unknown operation kinds {sorted(unknown)} in matcher profile {name}')
+        self.name = name
+        self.operations = operations
+        self.fingerprint = hashlib.sha1(json.dumps(operations, sort_keys=True).encode('utf-8')).hexdigest()
+
+        self._exact: Dict[str, str] = {}
+        prefixes, regexes = [], []
+        for kind, rules in operations.items():
+            for exact in rules.get('exact', []):
+                self._exact.setdefault(exact, kind)
+            prefixes.extend((re.escape(prefix), kind) for prefix in rules.get('prefix', []))
+            regexes.extend((regex, kind) for regex in rules.get('regex', []))
+
+        patterns = prefixes + regexes
+        self._group_kinds = {f'g{i}': kind for i, (_, kind) in enumerate(patterns)}
+        self._pattern = re.compile('|'.join(f'(?P<g{i}>{p})' for i, (p, _) in enumerate(patterns))) \
+            if patterns else None
+        self._memo: Dict[str, Optional[str]] = {}
+
+    def kind(self, name: str) -> Optional[str]:
+        """The operation kind of the operator name, or None."""
+        try:
+            return self._memo[name]
+        except KeyError:
+            pass
+        kind = self._exact.get(name)
+        if kind is None and self._pattern is not None and isinstance(name, str):
+            m = self._pattern.match(name)
+            if m:
+                kind = self._group_kinds[m.lastgroup]
+        if len(self._memo) < _MAX_MEMO_SIZE:
+            self._memo[name] = kind
+        return kind
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_memo'] = {}
+        return state
+
+
+def _load_spec(spec: Dict, name: str) -> OperationMatcher:
+    """The profile of the spec. Its rules are added to those of the base profile, kind by kind and rule
+    type by rule type."""
+    base = spec.get('base')
+    operations = {kind: {rule: list(values) for rule, values in rules.items()}
+                  for kind, rules in (BUILTIN_PROFILES[base] if base else {}).items()}
+    for kind, rules in spec.get('operations', {}).items():
+        merged = operations.setdefault(kind, {})
+        for rule, values in rules.items():
+            merged[rule] = merged.get(rule, []) + list(values)
+    return OperationMatcher(spec.get('name', name), operations)
+
+
+def get_matcher(profile: Optional[str] = None) -> OperationMatcher:
+    """The built-in profile of that name or the profile in that json file,
+    TORCH_PROFILER_MATCHER_PROFILE when not given."""
+    profile = profile or os.environ.get('TORCH_PROFILER_MATCHER_PROFILE') or DEFAULT_PROFILE
+    if profile in BUILTIN_PROFILES:
+        return OperationMatcher(profile, BUILTIN_PROFILES[profile])
+    return _load_spec(json.loads(io.read(profile)), profile)
+
+
+def load_run_matcher(run_dir: str) -> OperationMatcher:
+    """The matcher of the run: its matcher_profile.json if present, otherwise the default one."""
+    path = io.join(run_dir, RUN_PROFILE_FILE)
+    try:
+        if io.exists(path):
+            return _load_spec(json.loads(io.read(path)), path)
+    except Exception as ex:
+        logger.warning('Failed to load matcher profile %s, the default profile is used. Exception=%s', path, ex)
+    return get_matcher()
+
+
+DEFAULT_MATCHER = OperationMatcher(DEFAULT_PROFILE, BUILTIN_PROFILES[DEFAULT_PROFILE])
@@ -2,30 +2,40 @@
 # Copyright (c) Microsoft Corporation. All rights reserved.
 # --------------------------------------------------------------------------
 import sys
-import copy
 # pyre-unsafe
 import atexit
-import json
+import bisect
+import hashlib
 import os
 import shutil
 import tempfile
 import threading
-import time
-import re
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 from queue import Queue
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import werkzeug
 # pyre-fixme[21]: Could not find module `tensorboard.plugins`.
 from tensorboard.plugins import base_plugin
 from werkzeug import exceptions, wrappers
 
-from . import consts, io, utils
-from .profiler import RunLoader
+from . import io, json_codec, utils
+from .discovery import RunDiscovery
+from .encoding import IDENTITY, MIN_COMPRESS_SIZE, BodyCache, compress, compress_stream, negotiate_encoding
+from .profiler import ParsePool, ProfileCache, RunLoader
+from .comm_stats import STATISTICS, collect_communication_stats, merge_stats
+from .residency import ResidencyManager, estimate_size
 from .run import Run
+from .views import dag_step_view, projected_step_view, runtime_step_view
 
 logger = utils.get_logger()
 
+# serialized views of one worker: step -> json bytes, and the step numbers in ascending order
+WorkerViews = namedtuple('WorkerViews', ['runtime', 'dag', 'step_index'])
+# data of one run kept by the ResidencyManager: worker -> operator tree, WorkerViews, estimated bytes and
+# the DurationStats of the communications
+RunData = namedtuple('RunData', ['trees', 'views', 'sizes', 'comm'])
+
 
 def decorate_headers(func):
     def wrapper(*args, **kwargs):
@@ -43,6 +53,7 @@ class CGSDNNAnalysisPlugin(base_plugin.TBPlugin):
     plugin_name = 'cgs-dnn-analysis'
     headers = [('X-Content-Type-Options', 'nosniff')]
     CONTENT_TYPE = 'application/json'
+    NDJSON_CONTENT_TYPE = 'application/x-ndjson'
 
     def __init__(self, context: base_plugin.TBContext):
         """Instantiates CGSDNNAnalysisPlugin."""
@@ -57,16 +68,31 @@ class CGSDNNAnalysisPlugin(base_plugin.TBPlugin):
 
         self._load_lock = threading.Lock()
         self._load_threads = []
+        # run directory being loaded -> the trace files to load it again with once done, or None
+        self._pending_loads: Dict[str, Any] = {}
+        # run directories whose next load parses every worker again instead of reusing the loaded profiles
+        self._reparse_runs = set()
 
         self._runs = OrderedDict()
         self._runs_lock = threading.Lock()
-        
-        # เพิ่ม cache สำหรับเก็บ operator trees
-        self._operator_trees = {}
-        self._operator_trees_lock = threading.Lock()
+
+        # version counters ของข้อมูลสำหรับ ETag: ต่อ run และของทั้งหมด
+        self._versions_lock = threading.Lock()
+        self._run_versions: Dict[str, int] = {}
+        self._data_version = 0
+        # run -> collective -> DurationStats ที่รวมทุก worker แล้ว ใช้ lock เดียวกับ version
+        self._comm_stats: Dict[str, Dict[str, Any]] = {}
+        self._body_cache = BodyCache()
 
         self._temp_dir = tempfile.mkdtemp()
         self._cache = io.Cache(self._temp_dir)
+        # run -> RunData (operator trees และ WorkerViews ที่ serialize แล้วของทุก worker)
+        # เก็บในหน่วยความจำไม่เกิน TORCH_PROFILER_RESIDENT_MAX_BYTES run ที่ไม่ได้ดูนานที่สุดถูกย้ายไปไว้บน disk
+        self._residency = ResidencyManager.from_env(os.path.join(self._temp_dir, 'resident'))
+        # parse results persisted across restarts, see ProfileCache
+        self._profile_cache = ProfileCache.from_env()
+        # bounded pool of parse processes shared by all the runs
+        self._parse_pool = ParsePool.from_env()
         self._queue = Queue()
 
         monitor_runs = threading.Thread(target=self._monitor_runs, name='monitor_runs', daemon=True)
@@ -107,135 +133,39 @@ class CGSDNNAnalysisPlugin(base_plugin.TBPlugin):
 
     @wrappers.Request.application
     def runs_route(self, request: werkzeug.Request):
+        data_loading = self.is_loading
         with self._runs_lock:
             names = list(self._runs.keys())
         data = {
             'runs': names,
-            'loading': self.is_loading
+            'loading': data_loading
         }
-        return self.respond_as_json(data)
+        return self.respond_versioned(request, (self._data_version, data_loading), lambda: self._dumps(data))
 
     @wrappers.Request.application
     def workers_route(self, request: werkzeug.Request):
         name = request.args.get('run')
         self._validate(run=name)
+        self._parse_pool.prioritize(name)
         run = self._get_run(name)
-        return self.respond_as_json(run.workers)
+        return self.respond_versioned(request, self._run_version(name), lambda: self._dumps(run.workers))
 
     @wrappers.Request.application
     def runtime_route(self, request: werkzeug.Request):
         run_name = request.args.get('run')
         worker_name = request.args.get('worker')
         self._validate(run=run_name, worker=worker_name)
-        
-        # ใช้ข้อมูลจาก cache แทนการเรียก get_operator_tree ใหม่
-        with self._operator_trees_lock:
-            if run_name not in self._operator_trees:
-                raise exceptions.NotFound(f"Run '{run_name}' not found in operator trees cache")
-            if worker_name not in self._operator_trees[run_name]:
-                raise exceptions.NotFound(f"Worker '{worker_name}' not found in operator trees cache for run '{run_name}'")
-            
-            # ทำงานบนสำเนาเพื่อไม่แก้ไข cache ต้นฉบับ
-            content = copy.deepcopy(self._operator_trees[run_name][worker_name])
-
-        # ปรับแต่งชื่อให้แสดงผลอ่านง่ายเฉพาะตอนส่งให้ frontend
-        def prettify_name(name: str) -> str:
-            if not isinstance(name, str):
-                return name
-            s = name
-            # ลบ "nn.Module:" แบบตรงไปตรงมา (ทั้งมี/ไม่มีช่องว่าง)
-            if 'nn.Module:' in s:
-                s = s.replace('nn.Module: ', '').replace('nn.Module:', '')
-            # เผื่อมีรูปแบบอื่นตกค้าง ให้ regex เก็บตกอีกชั้น
-            s = re.sub(r'\bnn\.Module\s*:\s*', '', s)
-            # ลบ namespace บางตัวที่ยาว (aten::, autograd::, torch::)
-            s = re.sub(r'^(?:aten|autograd|torch)::', '', s)
-            # ย่อ Sequential_# -> Seq#
-            s = re.sub(r'^Sequential_(\\d+)', r'Seq\\1', s)
-            # ตั้งชื่อ Optimizer ให้สั้นลงเป็นแค่ "Optimizer"
-            s = re.sub(r'^Optimizer(?:[.#].*)?$', 'Optimizer', s)
-            return s
-
-        def prettify_names_inplace(obj):
-            if isinstance(obj, dict):
-                name_value = obj.get('name')
-                if isinstance(name_value, str):
-                    obj['name'] = prettify_name(name_value)
-                for v in obj.values():
-                    if isinstance(v, (dict, list)):
-                        prettify_names_inplace(v)
-            elif isinstance(obj, list):
-                for item in obj:
-                    prettify_names_inplace(item)
-
-        prettify_names_inplace(content)
-
-        # ทำ normalization แยกตามแต่ละ step ให้สเกลอยู่ในช่วง 0..10
-        def collect_times(obj, starts, ends):
-            if isinstance(obj, dict):
-                st = obj.get('start_time')
-                et = obj.get('end_time')
-                if isinstance(st, (int, float)):
-                    starts.append(st)
-                if isinstance(et, (int, float)):
-                    ends.append(et)
-                for v in obj.values():
-                    if isinstance(v, (dict, list)):
-                        collect_times(v, starts, ends)
-            elif isinstance(obj, list):
-                for it in obj:
-                    collect_times(it, starts, ends)
-
-        def normalize_within_step(step_obj):
-            step_starts: list = []
-            step_ends: list = []
-            collect_times(step_obj, step_starts, step_ends)
-            if not step_starts or not step_ends:
-                return
-            min_start = min(step_starts)
-            max_end = max(step_ends)
-            span = max_end - min_start
-            if span <= 0:
-                return
-            scale = 10.0 / span
-
-            def apply_norm(obj):
-                if isinstance(obj, dict):
-                    st = obj.get('start_time')
-                    et = obj.get('end_time')
-                    if isinstance(st, (int, float)):
-                        obj['start_time'] = (st - min_start) * scale
-                    if isinstance(et, (int, float)):
-                        obj['end_time'] = (et - min_start) * scale
-                    if 'start_time' in obj and 'end_time' in obj:
-                        obj['dur'] = obj['end_time'] - obj['start_time']
-                    for v in obj.values():
-                        if isinstance(v, (dict, list)):
-                            apply_norm(v)
-                elif isinstance(obj, list):
-                    for it in obj:
-                        apply_norm(it)
-
-            apply_norm(step_obj)
-
-        for step_key, step_content in content.items():
-            normalize_within_step(step_content)
-
-        return self.respond_as_json(content)
+        self._parse_pool.prioritize(run_name)
+
+        # ชื่อที่อ่านง่ายและเวลาที่ normalize แล้ว ถูกคำนวณไว้ตอนรับ run (ดู _receive_runs)
+        views = self._get_worker_views(run_name, worker_name)
+        return self._respond_steps(request, self._run_version(run_name), views.runtime, views.step_index)
 
     @wrappers.Request.application
     def dag_route(self, request: werkzeug.Request):
         """
-        สร้างข้อมูล DAG จาก operator trees ใน cache ตามกฎที่ผู้ใช้ระบุ
-        - โหนดมี 2 ประเภท: computation (บน) และ communication (ล่าง)
-        - ใช้ dur เป็นตัวกำหนดสเกลขนาดเมื่อไปวาดด้านหน้า
-        - รวม broadcast ทั้ง step เป็นก้อนเดียว
-        - รวม children การสื่อสารของแต่ละ backward (เช่น nccl:all_reduce) เป็นก้อนเดียวต่อ backward
-        - สร้างเส้นเชื่อม:
-          * โหนด computation → โหนด computation ถัดไป (start >= end ที่ใกล้ที่สุด)
-          * โหนด backward → โหนด all_reduce ที่ถูกรวมของมัน (ถ้ามี)
-          * ทุกโหนด communication → โหนด computation ถัดไป
-        ผลลัพธ์ต่อ 1 step:
+        ข้อมูล DAG ต่อ step ที่คำนวณไว้ล่วงหน้าจาก operator trees (ดู views.dag_step_view)
+        ผลลัพธ์:
         {
           "<step>": { nodes: [ {id,label,category,lane,dur,start_time,end_time} ], edges: [ {source,target,kind} ] }
         }
@@ -243,291 +173,10 @@ class CGSDNNAnalysisPlugin(base_plugin.TBPlugin):
         run_name = request.args.get('run')
         worker_name = request.args.get('worker')
         self._validate(run=run_name, worker=worker_name)
+        self._parse_pool.prioritize(run_name)
 
-        # ดึงข้อมูลดิบจาก cache
-        with self._operator_trees_lock:
-            if run_name not in self._operator_trees:
-                raise exceptions.NotFound(f"Run '{run_name}' not found in operator trees cache")
-            if worker_name not in self._operator_trees[run_name]:
-                raise exceptions.NotFound(
-                    f"Worker '{worker_name}' not found in operator trees cache for run '{run_name}'"
-                )
-            tree = copy.deepcopy(self._operator_trees[run_name][worker_name])
-
-        # ฟังก์ชันช่วยทำชื่อให้อ่านง่ายเทียบกับ runtime_route
-        def prettify_name(name: str) -> str:
-            if not isinstance(name, str):
-                return name
-            s = name
-            if 'nn.Module:' in s:
-                s = s.replace('nn.Module: ', '').replace('nn.Module:', '')
-            s = re.sub(r'\bnn\.Module\s*:\s*', '', s)
-            s = re.sub(r'^(?:aten|autograd|torch)::', '', s)
-            s = re.sub(r'^Sequential_(\d+)', r'Seq\1', s)
-            s = re.sub(r'^Optimizer(?:[.#].*)?$', 'Optimizer', s)
-            return s
-
-        def prettify_names_inplace(obj):
-            if isinstance(obj, dict):
-                if isinstance(obj.get('name'), str):
-                    obj['name'] = prettify_name(obj['name'])
-                for v in obj.values():
-                    if isinstance(v, (dict, list)):
-                        prettify_names_inplace(v)
-            elif isinstance(obj, list):
-                for it in obj:
-                    prettify_names_inplace(it)
-
-        prettify_names_inplace(tree)
-
-        def duration_of(ev: dict) -> float:
-            dur = ev.get('dur')
-            if isinstance(dur, (int, float)):
-                return float(dur)
-            st = ev.get('start_time', 0)
-            et = ev.get('end_time', 0)
-            if isinstance(st, (int, float)) and isinstance(et, (int, float)):
-                return float(et) - float(st)
-            return 0.0
-
-        def group_comm_interval(events: list):
-            # รวมช่วงเวลาเป็นก้อนเดียวจากกลุ่ม communication ที่ส่งมา
-            if not events:
-                return None
-            starts, ends = [], []
-            for ev in events:
-                st = ev.get('start_time')
-                et = ev.get('end_time')
-                if isinstance(st, (int, float)) and isinstance(et, (int, float)):
-                    starts.append(float(st))
-                    ends.append(float(et))
-            if not starts or not ends:
-                return None
-            st = min(starts)
-            et = max(ends)
-            return {
-                'start_time': st,
-                'end_time': et,
-                'dur': max(0.0, et - st),
-                'category': 'communication',
-            }
-
-        def collect_all_reduce(events: list) -> list:
-            found = []
-            for ev in events or []:
-                for ch in ev.get('children', []) or []:
-                    nm = (ch.get('name') or '').lower()
-                    if 'all_reduce' in nm:
-                        found.append(ch)
-                found.extend(collect_all_reduce(ev.get('children', [])))
-            return found
-
-        # --- Normalize times per step to 0..10 (เพื่อให้ dur เป็นสเกลเดียวกับ runtime) ---
-        def collect_times(obj, starts, ends):
-            if isinstance(obj, dict):
-                st = obj.get('start_time')
-                et = obj.get('end_time')
-                if isinstance(st, (int, float)):
-                    starts.append(st)
-                if isinstance(et, (int, float)):
-                    ends.append(et)
-                for v in obj.values():
-                    if isinstance(v, (dict, list)):
-                        collect_times(v, starts, ends)
-            elif isinstance(obj, list):
-                for it in obj:
-                    collect_times(it, starts, ends)
-
-        def normalize_step(step_obj):
-            starts, ends = [], []
-            collect_times(step_obj, starts, ends)
-            if not starts or not ends:
-                return
-            mn = min(starts); mx = max(ends); span = mx - mn
-            if span <= 0: return
-            scale = 10.0 / span
-            def apply(o):
-                if isinstance(o, dict):
-                    if isinstance(o.get('start_time'), (int, float)):
-                        o['start_time'] = (o['start_time'] - mn) * scale
-                    if isinstance(o.get('end_time'), (int, float)):
-                        o['end_time'] = (o['end_time'] - mn) * scale
-                    if 'start_time' in o and 'end_time' in o:
-                        o['dur'] = o['end_time'] - o['start_time']
-                    for v in o.values():
-                        if isinstance(v, (dict, list)):
-                            apply(v)
-                elif isinstance(o, list):
-                    for it in o:
-                        apply(it)
-            apply(step_obj)
-
-        result = {}
-
-        for step_key, step in tree.items():
-            # normalize ก่อน
-            normalize_step(step)
-            nodes = []
-            edges = []
-            id_seq = 0
-            def next_id(prefix: str) -> str:
-                nonlocal id_seq
-                id_seq += 1
-                return f"{prefix}_{id_seq}"
-
-            comp_nodes = []  # เก็บ (id, ev)
-
-            # เตรียมลิสต์โครงสร้างหลักสำหรับลิงก์ที่ชัดเจน
-            forwards_src = step.get('forward', []) or []
-            backward_list = step.get('backward', []) or []
-            loss = step.get('loss') if isinstance(step.get('loss'), dict) else None
-            opt = step.get('optimizer') if isinstance(step.get('optimizer'), dict) else None
-
-            # --- Computation: forward ---
-            forward_ids = []
-            for ev in forwards_src:
-                nid = next_id('comp')
-                nodes.append({
-                    'id': nid,
-                    'label': ev.get('name', 'forward'),
-                    'category': 'computation',
-                    'lane': 'top',
-                    'start_time': ev.get('start_time'),
-                    'end_time': ev.get('end_time'),
-                    'dur': duration_of(ev),
-                })
-                comp_nodes.append((nid, ev))
-                forward_ids.append(nid)
-
-            # --- Computation: loss ---
-            if loss:
-                nid = next_id('comp')
-                nodes.append({
-                    'id': nid,
-                    'label': loss.get('name', 'loss'),
-                    'category': 'computation',
-                    'lane': 'top',
-                    'start_time': loss.get('start_time'),
-                    'end_time': loss.get('end_time'),
-                    'dur': duration_of(loss),
-                })
-                comp_nodes.append((nid, loss))
-                loss_id = nid
-            else:
-                loss_id = None
-
-            # --- Computation: backward (และสกัด communication ของมัน) ---
-            backward_id_to_comm_id = {}
-            backward_ids = []
-            for ev in backward_list:
-                # backward node
-                nid = next_id('comp')
-                nodes.append({
-                    'id': nid,
-                    'label': ev.get('name', 'backward'),
-                    'category': 'computation',
-                    'lane': 'top',
-                    'start_time': ev.get('start_time'),
-                    'end_time': ev.get('end_time'),
-                    'dur': duration_of(ev),
-                })
-                comp_nodes.append((nid, ev))
-                backward_ids.append(nid)
-
-                # group all_reduce children for this backward
-                ar_children = collect_all_reduce([ev])
-                grouped = group_comm_interval(ar_children)
-                if grouped:
-                    cid = next_id('comm')
-                    nodes.append({
-                        'id': cid,
-                        'label': 'nccl:all_reduce',
-                        'category': 'communication',
-                        'lane': 'bottom',
-                        **grouped,
-                    })
-                    # edge: backward -> its all_reduce
-                    edges.append({'source': nid, 'target': cid, 'kind': 'backward_to_allreduce'})
-                    backward_id_to_comm_id[nid] = cid
-
-            # --- Computation: optimizer ---
-            if opt:
-                nid = next_id('comp')
-                nodes.append({
-                    'id': nid,
-                    'label': opt.get('name', 'optimizer'),
-                    'category': 'computation',
-                    'lane': 'top',
-                    'start_time': opt.get('start_time'),
-                    'end_time': opt.get('end_time'),
-                    'dur': duration_of(opt),
-                })
-                comp_nodes.append((nid, opt))
-                optimizer_id = nid
-            else:
-                optimizer_id = None
-
-            # --- Communication: broadcasts (รวมทั้ง step เป็นก้อนเดียว) ---
-            # รวม broadcasts ทั้งหมดใน step (ถ้ามีมากกว่า 1 จะถูกรวมเป็นก้อนเดียว)
-            bcast_group = group_comm_interval(step.get('broadcasts', []) or [])
-            bcast_id = None
-            if bcast_group:
-                bcast_id = next_id('comm')
-                nodes.append({
-                    'id': bcast_id,
-                    'label': 'nccl:broadcast',
-                    'category': 'communication',
-                    'lane': 'bottom',
-                    **bcast_group,
-                })
-
-            # --- เชื่อมโยงตามกฎที่กำหนด ---
-            # 1) broadcast -> forward ตัวแรก
-            if bcast_id and forward_ids:
-                edges.append({'source': bcast_id, 'target': forward_ids[0], 'kind': 'bcast_to_first_forward'})
-
-            # 2) chain forwards
-            for i in range(len(forward_ids)-1):
-                edges.append({'source': forward_ids[i], 'target': forward_ids[i+1], 'kind': 'seq'})
-
-            # 3) last forward -> loss (ถ้ามี)
-            if loss_id and forward_ids:
-                edges.append({'source': forward_ids[-1], 'target': loss_id, 'kind': 'seq'})
-
-            # --- สร้างเส้นสำหรับ communication → computation ถัดไป ---
-            # (จะสร้างหลังรู้ลำดับ backward)
-
-            # 4) loss -> backward แรก
-            if loss_id and backward_ids:
-                edges.append({'source': loss_id, 'target': backward_ids[0], 'kind': 'seq'})
-
-            # ตอนสร้าง backward เราได้ทำ map backward_id_to_comm_id แล้ว
-            # เราจะสร้างลิงก์ตามกฎ: backward -> (all_reduce ถ้ามี) -> backward ถัดไป; ถ้าไม่มีถัดไปให้วิ่งไป optimizer
-            for i, bid in enumerate(backward_ids):
-                comm_id = backward_id_to_comm_id.get(bid)
-                next_b = backward_ids[i+1] if i+1 < len(backward_ids) else None
-                if comm_id:
-                    edges.append({'source': bid, 'target': comm_id, 'kind': 'backward_to_allreduce'})
-                    if next_b:
-                        edges.append({'source': comm_id, 'target': next_b, 'kind': 'allreduce_to_next_backward'})
-                    else:
-                        # ไป optimizer ถ้ามี
-                        if optimizer_id:
-                            edges.append({'source': comm_id, 'target': optimizer_id, 'kind': 'allreduce_to_optimizer'})
-                else:
-                    if next_b:
-                        edges.append({'source': bid, 'target': next_b, 'kind': 'seq'})
-                    else:
-                        if optimizer_id:
-                            edges.append({'source': bid, 'target': optimizer_id, 'kind': 'to_optimizer'})
-
-            # ถ้าไม่มี backward แต่มี loss และ optimizer ให้ต่อ loss -> optimizer
-            if loss_id and not backward_ids and optimizer_id:
-                edges.append({'source': loss_id, 'target': optimizer_id, 'kind': 'seq'})
-
-            result[step_key] = { 'nodes': nodes, 'edges': edges }
-
-        return self.respond_as_json(result)
+        views = self._get_worker_views(run_name, worker_name)
+        return self._respond_steps(request, self._run_version(run_name), views.dag, views.step_index)
 
     @wrappers.Request.application
     def static_file_route(self, request: werkzeug.Request):
@@ -553,9 +202,133 @@ class CGSDNNAnalysisPlugin(base_plugin.TBPlugin):
     def respond_as_json(obj):
         if hasattr(obj, 'to_dict'):
             obj = obj.to_dict()
-        content = json.dumps(obj)
+        content = json_codec.dumps(obj)
         return werkzeug.Response(content, content_type=CGSDNNAnalysisPlugin.CONTENT_TYPE, headers=CGSDNNAnalysisPlugin.headers)
 
+    def respond_versioned(self, request: werkzeug.Request, version, build_body: Callable[[], bytes], headers=None):
+        """
+        ตอบ json bytes จาก build_body() พร้อม strong ETag ที่คำนวณจาก version ของข้อมูล, URL และ encoding
+        - ถ้า If-None-Match ตรงกับ ETag ตอบ 304 โดยไม่ต้องสร้าง body
+        - บีบอัดด้วย br/gzip ตาม Accept-Encoding
+        """
+        encoding = negotiate_encoding(request.accept_encodings)
+        key = f'{request.path}?{request.query_string.decode("latin-1")}|{version}|{encoding}'
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        headers = CGSDNNAnalysisPlugin.headers + [('Vary', 'Accept-Encoding'), ('Cache-Control', 'no-cache')] + \
+            (headers or [])
+
+        if request.if_none_match.contains(etag):
+            response = werkzeug.Response(status=304, headers=headers)
+            response.set_etag(etag)
+            return response
+
+        cached = self._body_cache.get(etag)
+        if cached is None:
+            body = build_body()
+            if len(body) < MIN_COMPRESS_SIZE:
+                encoding = IDENTITY
+            cached = compress(body, encoding), encoding
+            self._body_cache.put(etag, *cached)
+        body, encoding = cached
+
+        response = werkzeug.Response(body, content_type=CGSDNNAnalysisPlugin.CONTENT_TYPE, headers=headers)
+        if encoding != IDENTITY:
+            response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        return response
+
+    def respond_streaming(self, request: werkzeug.Request, version, chunks: Callable[[], Iterable[bytes]],
+                          content_type: str = CONTENT_TYPE):
+        """
+        เหมือน respond_versioned แต่ส่ง body เป็นชิ้น ๆ ตามที่ chunks() สร้าง โดยไม่รวมทั้ง body ไว้ในหน่วยความจำ
+        - ETag และการตอบ 304 ใช้ key แบบเดียวกับ respond_versioned
+        - บีบอัดทีละชิ้นด้วย br/gzip ตาม Accept-Encoding และไม่เก็บใน BodyCache
+        """
+        encoding = negotiate_encoding(request.accept_encodings)
+        key = f'{request.path}?{request.query_string.decode("latin-1")}|{version}|{encoding}'
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        headers = CGSDNNAnalysisPlugin.headers + [('Vary', 'Accept-Encoding'), ('Cache-Control', 'no-cache')]
+
+        if request.if_none_match.contains(etag):
+            response = werkzeug.Response(status=304, headers=headers)
+            response.set_etag(etag)
+            return response
+
+        response = werkzeug.Response(compress_stream(chunks(), encoding), content_type=content_type,
+                                     headers=headers, direct_passthrough=True)
+        if encoding != IDENTITY:
+            response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        return response
+
+    @staticmethod
+    def _dumps(obj) -> bytes:
+        if hasattr(obj, 'to_dict'):
+            obj = obj.to_dict()
+        return json_codec.dumps(obj)
+
+    def _run_version(self, run_name: str) -> int:
+        with self._versions_lock:
+            return self._run_versions.get(run_name, 0)
+
+    def _respond_steps(self, request: werkzeug.Request, version: int, steps: Dict[int, bytes],
+                       step_index: List[int]):
+        """
+        ส่งเฉพาะ step ที่ขอผ่าน query parameters (ทุก step ถ้าไม่ระบุ)
+        - steps=1,3,5: เลือกเป็นรายตัว
+        - step_from= / step_to=: ช่วงของ step (รวมปลายทั้งสองด้าน)
+        - limit= / cursor=: แบ่งหน้า; cursor คือหมายเลข step แรกของหน้า
+          และหมายเลข step ของหน้าถัดไปส่งกลับใน header X-Next-Cursor
+        """
+        selected, next_cursor = self._select_steps(request, step_index)
+        headers = [('X-Next-Cursor', str(next_cursor))] if next_cursor is not None else []
+        return self.respond_versioned(request, version, lambda: self._join_steps(steps, selected), headers)
+
+    def _select_steps(self, request: werkzeug.Request, step_index: List[int]) -> Tuple[Optional[List[int]], Optional[int]]:
+        args = request.args
+        if not any(k in args for k in ('steps', 'step_from', 'step_to', 'limit', 'cursor')):
+            return None, None
+
+        lo = max(self._int_arg(args, 'step_from', step_index[0] if step_index else 0),
+                 self._int_arg(args, 'cursor', step_index[0] if step_index else 0))
+        hi = self._int_arg(args, 'step_to', step_index[-1] if step_index else 0)
+        selected = step_index[bisect.bisect_left(step_index, lo):bisect.bisect_right(step_index, hi)]
+        if 'steps' in args:
+            wanted = {self._parse_int('steps', v) for v in args['steps'].split(',') if v.strip()}
+            selected = [step for step in selected if step in wanted]
+
+        limit = self._int_arg(args, 'limit', None)
+        if limit is not None:
+            if limit <= 0:
+                raise exceptions.BadRequest('limit must be positive')
+            if len(selected) > limit:
+                return selected[:limit], selected[limit]
+        return selected, None
+
+    @classmethod
+    def _int_arg(cls, args, name: str, default):
+        value = args.get(name)
+        return default if value is None else cls._parse_int(name, value)
+
+    @staticmethod
+    def _parse_int(name: str, value: str) -> int:
+        try:
+            return int(value)
+        except ValueError:
+            raise exceptions.BadRequest(f'{name} must be an integer, got {value!r}')
+
+    @staticmethod
+    def _serialize_steps(steps: dict, build_view) -> Dict[Any, bytes]:
+        """step -> the serialized view of the step. The bytes are immutable, so the routes can share them."""
+        return {step: json_codec.dumps(build_view(content)) for step, content in steps.items()}
+
+    @staticmethod
+    def _join_steps(steps: Dict[Any, bytes], selected: Optional[List[Any]] = None) -> bytes:
+        """The json object of the serialized steps (only the selected ones if given)."""
+        keys = steps.keys() if selected is None else selected
+        items = (json_codec.dumps(str(step)) + b':' + steps[step] for step in keys)
+        return b'{' + b','.join(items) + b'}'
+
     @property
     def is_loading(self):
         with self._load_lock:
@@ -563,21 +336,30 @@ class CGSDNNAnalysisPlugin(base_plugin.TBPlugin):
 
     def _monitor_runs(self):
         logger.info('Monitor runs begin')
-        touched = set()
+        # run directory -> the trace files (name -> StatData) it was last loaded with
+        loaded = {}
+        discovery = RunDiscovery.from_env(self.logdir, self._profile_cache.cache_dir if self._profile_cache else None)
         while True:
             try:
-                run_dirs = self._get_run_dirs()
-                for run_dir in run_dirs:
-                    if run_dir not in touched:
-                        touched.add(run_dir)
+                run_dirs = discovery.scan()
+                for run_dir, files in run_dirs.items():
+                    if loaded.get(run_dir) == files:
+                        continue
+                    if run_dir in loaded:
+                        logger.info('Trace files of run directory %s changed', run_dir)
+                    else:
                         logger.info('Find run directory %s', run_dir)
-                        t = threading.Thread(target=self._load_run, args=(run_dir,))
-                        t.start()
-                        with self._load_lock:
-                            self._load_threads.append(t)
+                    loaded[run_dir] = files
+                    self._schedule_load(run_dir, files)
             except Exception as ex:
                 logger.warning('Failed to scan runs. Exception=%s', ex, exc_info=True)
-            time.sleep(consts.MONITOR_RUN_REFRESH_INTERNAL_IN_SECONDS)
+            try:
+                # sleeps with a backoff while nothing changes, or blocks on the inotify events
+                discovery.wait()
+            except Exception as ex:
+                logger.warning('Failed to wait for the changes of the runs. Exception=%s', ex, exc_info=True)
+                # e.g. polls the logdir instead of watching it
+                discovery = discovery.fallback()
 
     def _receive_runs(self):
         while True:
@@ -585,47 +367,113 @@ class CGSDNNAnalysisPlugin(base_plugin.TBPlugin):
             if run is None:
                 continue
             logger.info('Add run %s', run.name)
-            
-            # เพิ่ม run เข้าไปใน runs dictionary
+
             with self._runs_lock:
+                previous = self._runs.get(run.name)
+            try:
+                # การโหลดซ้ำไม่นับเป็นการเรียกดู run จึงไม่ไล่ run อื่นออกจากหน่วยความจำ
+                previous_data = self._residency.get(run.name, admit=False) if previous is not None else None
+            except Exception as ex:
+                logger.warning('Failed to read back the data of run %s. Exception=%s', run.name, ex)
+                previous_data = None
+            if previous_data is None and previous is not None and \
+                    any(previous.get_profile(w) is run.get_profile(w) for w in run.workers):
+                # tree ของ worker ที่ใช้ profile เดิมซ้ำมีอยู่ใน previous_data เท่านั้น
+                # จึงข้าม run นี้และให้ thread โหลด run ใหม่โดย parse ทุก worker
+                logger.warning('The data of run %s is not available, load it again without reusing its workers',
+                               run.name)
+                self._schedule_load(run.run_dir, reparse=True)
+                continue
+
+            # operator trees ของทุก worker และ view ของ /runtime และ /dag ที่สร้างไว้ล่วงหน้า นอก lock เพราะใช้เวลานาน
+            # worker ที่ profile ไม่เปลี่ยน (RunLoader ใช้ profile เดิมซ้ำ) ใช้ข้อมูลเดิม
+            data = RunData(trees={}, views={}, sizes={}, comm={})
+            for worker in run.workers:
+                profile = run.get_profile(worker)
+                if profile is None:
+                    continue
+                if previous_data is not None and previous.get_profile(worker) is profile and \
+                        worker in previous_data.trees:
+                    for field in RunData._fields:
+                        getattr(data, field)[worker] = getattr(previous_data, field)[worker]
+                    continue
+                tree = profile.get_operator_tree()
+                # tree ถูกเก็บใน _residency ที่เดียว จึงย้ายไปไว้บน disk ได้
+                profile.operator_tree = None
+                if not tree:
+                    continue
+                data.trees[worker] = tree
+                data.views[worker] = WorkerViews(runtime=self._serialize_steps(tree, runtime_step_view),
+                                                 dag=self._serialize_steps(
+                                                     tree, lambda step: dag_step_view(step, run.matcher)),
+                                                 step_index=sorted(tree))
+                data.sizes[worker] = estimate_size(tree) + sum(
+                    len(body) for steps in (data.views[worker].runtime, data.views[worker].dag)
+                    for body in steps.values())
+                data.comm[worker] = collect_communication_stats(tree, run.matcher)
+
+            # สลับ run, operator trees และ views พร้อมกัน request จึงไม่เห็นข้อมูลของสอง version ปนกัน
+            with self._runs_lock, self._versions_lock:
                 is_new = run.name not in self._runs
                 self._runs[run.name] = run
                 if is_new:
                     self._runs = OrderedDict(sorted(self._runs.items()))
-            
-            # โหลดและเก็บ operator trees สำหรับทุก worker
-            with self._operator_trees_lock:
-                if run.name not in self._operator_trees:
-                    self._operator_trees[run.name] = {}
-                
-                for worker in run.workers:
-                    profile = run.get_profile(worker)
-                    if profile:
-                        tree = profile.get_operator_tree()
-                        if tree:
-                            self._operator_trees[run.name][worker] = tree
-            
+                self._residency.put(run.name, data, sum(data.sizes.values()))
+                # สถิติการสื่อสารของ run เล็กพอที่จะอยู่ในหน่วยความจำตลอด
+                self._comm_stats[run.name] = merge_stats(data.comm[worker] for worker in data.trees)
+                # version ใหม่ทำให้ ETag เดิมของ run นี้ใช้ไม่ได้
+                self._run_versions[run.name] = self._run_versions.get(run.name, 0) + 1
+                self._data_version += 1
+            # เขียน run ที่ถูกไล่ออกลง disk นอก lock
+            self._residency.spill_pending()
+
             logger.info(f'Loaded operator trees for run {run.name}')
 
-    def _get_run_dirs(self):
-        if not io.isdir(self.logdir):
-            return
-        for root, _, files in io.walk(self.logdir):
-            for file in files:
-                if utils.is_chrome_trace_file(file):
-                    yield root
-                    break
+    def _schedule_load(self, run_dir, files=None, reparse=False):
+        """Load the run in a thread, or once more after the load in progress. files is the listing of its
+        trace files, None to list the directory. reparse parses every worker instead of reusing the
+        profiles of the loaded run."""
+        with self._load_lock:
+            if reparse:
+                self._reparse_runs.add(run_dir)
+            if run_dir in self._pending_loads:
+                # a load of the run is in progress, it loads the run again once done
+                if files is not None:
+                    self._pending_loads[run_dir] = files
+                return
+            self._pending_loads[run_dir] = None
+            t = threading.Thread(target=self._load_run, args=(run_dir, files))
+            self._load_threads.append(t)
+        t.start()
 
-    def _load_run(self, run_dir):
+    def _load_run(self, run_dir, files=None):
         name = self._get_run_name(run_dir)
-        try:
-            logger.info('Load run %s', name)
-            loader = RunLoader(name, run_dir, self._cache)
-            run = loader.load()
-            logger.info('Run %s loaded', name)
-            self._queue.put(run)
-        except Exception as ex:
-            logger.warning('Failed to load run %s. Exception=%s', name, ex, exc_info=True)
+        with self._runs_lock:
+            previous = self._runs.get(name)
+        while True:
+            with self._load_lock:
+                if run_dir in self._reparse_runs:
+                    self._reparse_runs.discard(run_dir)
+                    previous = None
+            try:
+                logger.info('Load run %s', name)
+                loader = RunLoader(name, run_dir, self._cache, self._profile_cache, self._parse_pool)
+                # only the new and changed worker files of an already loaded run are parsed
+                run = loader.load(previous, files)
+                logger.info('Run %s loaded', name)
+                self._queue.put(run)
+                previous = run
+            except Exception as ex:
+                logger.warning('Failed to load run %s. Exception=%s', name, ex, exc_info=True)
+
+            with self._load_lock:
+                # the trace files changed again during the load, or the run must be parsed again
+                pending = self._pending_loads.pop(run_dir, None)
+                if pending is not None or run_dir in self._reparse_runs:
+                    self._pending_loads[run_dir] = None
+                    files = pending
+                    continue
+                break
 
         t = threading.current_thread()
         with self._load_lock:
@@ -649,6 +497,17 @@ class CGSDNNAnalysisPlugin(base_plugin.TBPlugin):
             name = io.relpath(run_dir, logdir)
         return name
 
+    def _get_worker_views(self, run_name, worker_name) -> 'WorkerViews':
+        # อ่านกลับจาก disk ถ้า run ถูกไล่ออกจากหน่วยความจำไปแล้ว
+        data = self._residency.get(run_name)
+        if data is None:
+            raise exceptions.NotFound(f"Run '{run_name}' not found in operator trees cache")
+        if worker_name not in data.views:
+            raise exceptions.NotFound(
+                f"Worker '{worker_name}' not found in operator trees cache for run '{run_name}'"
+            )
+        return data.views[worker_name]
+
     def _validate(self, **kwargs):
         for name, v in kwargs.items():
             if v is None:
@@ -656,74 +515,122 @@ class CGSDNNAnalysisPlugin(base_plugin.TBPlugin):
                 
     def get_all_operator_trees(self):
         """เรียกดูข้อมูล operator trees ทั้งหมดที่มีอยู่"""
-        with self._operator_trees_lock:
-            return self._operator_trees.copy()
+        with self._runs_lock:
+            names = list(self._runs)
+        all_trees = {}
+        for name in names:
+            # run ที่อยู่บน disk ถูกอ่านกลับมาชั่วคราว ไม่ไล่ run ที่เพิ่งดูออกจากหน่วยความจำ
+            data = self._residency.get(name, admit=False)
+            if data is not None:
+                all_trees[name] = data.trees
+        return all_trees
             
     @wrappers.Request.application
     def all_operator_trees_route(self, request: werkzeug.Request):
-        """Returns all operator trees data"""
-        return self.respond_as_json(self.get_all_operator_trees())
+        """
+        Returns all operator trees data, streamed run by run and worker by worker.
+        - format=json (default): one object run -> worker -> step -> tree, as get_all_operator_trees
+        - format=ndjson: one line {"run": ..., "worker": ..., "steps": {...}} per worker
+        - run= / worker=: only these runs / workers, repeated or comma separated
+        - fields=: only these fields of every node, e.g. fields=name,start_time,end_time for the timings;
+          the children are kept only when fields contains children
+        """
+        args = request.args
+        framing = args.get('format', 'json')
+        if framing not in ('json', 'ndjson'):
+            raise exceptions.BadRequest(f'format must be json or ndjson, got {framing!r}')
+        runs = self._list_arg(args, 'run')
+        workers = self._list_arg(args, 'worker')
+        fields = self._list_arg(args, 'fields')
+
+        with self._runs_lock:
+            names = list(self._runs)
+        if runs is not None:
+            unknown = [name for name in runs if name not in names]
+            if unknown:
+                raise exceptions.NotFound(f"Run '{unknown[0]}' not found in operator trees cache")
+            names = [name for name in names if name in runs]
+
+        ndjson = framing == 'ndjson'
+        return self.respond_streaming(
+            request, self._data_version,
+            lambda: self._operator_tree_chunks(names, workers, fields, ndjson),
+            CGSDNNAnalysisPlugin.NDJSON_CONTENT_TYPE if ndjson else CGSDNNAnalysisPlugin.CONTENT_TYPE)
+
+    def _operator_tree_chunks(self, names: List[str], workers: Optional[frozenset], fields: Optional[frozenset],
+                              ndjson: bool) -> Iterator[bytes]:
+        """
+        ชิ้นของ body ของ /all_operator_trees: หนึ่งชิ้นต่อ worker ของแต่ละ run
+        แบบ json ได้ bytes เดียวกับ json_codec.dumps(get_all_operator_trees()) เมื่อไม่มีตัวกรอง
+        """
+        first_run = True
+        if not ndjson:
+            yield b'{'
+        for name in names:
+            # run ที่อยู่บน disk ถูกอ่านกลับมาชั่วคราว ไม่ไล่ run ที่เพิ่งดูออกจากหน่วยความจำ
+            data = self._residency.get(name, admit=False)
+            if data is None:
+                continue
+            run_key = json_codec.dumps(name)
+            first_worker = True
+            for worker, steps in data.trees.items():
+                if workers is not None and worker not in workers:
+                    continue
+                if fields is not None:
+                    steps = {step: projected_step_view(content, fields) for step, content in steps.items()}
+                worker_key = json_codec.dumps(worker)
+                body = self._join_steps({step: json_codec.dumps(content) for step, content in steps.items()})
+                if ndjson:
+                    yield b'{"run":' + run_key + b',"worker":' + worker_key + b',"steps":' + body + b'}\n'
+                    continue
+                prefix = (b'' if first_run else b',') + run_key + b':{' if first_worker else b','
+                first_run = first_worker = False
+                yield prefix + worker_key + b':' + body
+            if not ndjson and not first_worker:
+                yield b'}'
+            elif not ndjson and workers is None:
+                # a run without workers is still a key of the object
+                yield (b'' if first_run else b',') + run_key + b':{}'
+                first_run = False
+        if not ndjson:
+            yield b'}'
+
+    @staticmethod
+    def _list_arg(args, name: str) -> Optional[frozenset]:
+        """The values of a repeated or comma separated parameter, None when it is not given."""
+        if name not in args:
+            return None
+        return frozenset(v.strip() for value in args.getlist(name) for v in value.split(',') if v.strip())
 
     @wrappers.Request.application
     def communication_timing_route(self, request: werkzeug.Request):
         """
-        Processes all cached operator trees and returns the averaged communication
-        timing data for each run, without enforcing a common structure.
+        Returns a statistic of the durations of every communication of each run, without enforcing
+        a common structure. stat= selects it: mean (default), std, min, max, count, p50, p95, p99,
+        or all for an object of all of them per communication.
+        """
+        stat = request.args.get('stat', 'mean')
+        if stat != 'all' and stat not in STATISTICS:
+            raise exceptions.BadRequest(f'stat must be all or one of {", ".join(STATISTICS)}, got {stat!r}')
+        return self.respond_versioned(request, self._data_version,
+                                      lambda: self._dumps(self.get_communication_timing(stat)))
+
+    def get_communication_timing(self, stat: str = 'mean'):
+        """
+        สถิติของเวลาการสื่อสารแต่ละครั้งของทุก run จาก DurationStats ที่รวมไว้ตอนรับ run (ดู comm_stats.py)
+        ผลลัพธ์จะเป็น Dictionary ที่มี run_name เป็น key หลัก
+        {
+          "run_name_1": {"broadcast_0": 0.01, "all_reduce_0": 0.03, ...},
+          "run_name_2": {"broadcast_0": 0.02, "all_reduce_1": 0.05, ...} // key อาจไม่เหมือนกัน
+        }
         """
-        all_trees = self.get_all_operator_trees()
-        
-        collected_durations = {}
-
-        # 1. วนลูปเพื่อรวบรวมข้อมูล (ส่วนนี้เหมือนเดิม)
-        for run_name, workers_data in all_trees.items():
-            if run_name not in collected_durations:
-                collected_durations[run_name] = {}
-
-            for worker_name, steps_data in workers_data.items():
-                for step_name, step_content in steps_data.items():
-                    # --- ดึงข้อมูล Broadcasts ---
-                    broadcasts = step_content.get("broadcasts", [])
-                    for i, event in enumerate(broadcasts):
-                        key = f"broadcast_{i}"
-                        if key not in collected_durations[run_name]:
-                            collected_durations[run_name][key] = []
-                        duration = event.get("end_time", 0) - event.get("start_time", 0)
-                        if duration > 0:
-                            collected_durations[run_name][key].append(duration)
-
-                    # --- ดึงข้อมูล All Reduce จาก Backward pass ---
-                    backward_events = step_content.get("backward", [])
-                    all_reduce_counter = 0
-                    
-                    def find_all_reduce(events):
-                        nonlocal all_reduce_counter
-                        for event in events:
-                            children = event.get("children", [])
-                            for child in children:
-                                if child.get("name") == "nccl:all_reduce":
-                                    key = f"all_reduce_{all_reduce_counter}"
-                                    if key not in collected_durations[run_name]:
-                                        collected_durations[run_name][key] = []
-                                    dur = child.get("dur", 0)
-                                    if dur > 0:
-                                        collected_durations[run_name][key].append(dur)
-                                    all_reduce_counter += 1
-                            find_all_reduce(children)
-                    find_all_reduce(backward_events)
-
-        # ### ส่วนที่แก้ไข ###
-        # 2. คำนวณค่าเฉลี่ยและสร้างผลลัพธ์สุดท้าย
-        # ผลลัพธ์จะเป็น Dictionary ที่มี run_name เป็น key หลัก
-        # {
-        #   "run_name_1": {"broadcast_0": 0.01, "all_reduce_0": 0.03, ...},
-        #   "run_name_2": {"broadcast_0": 0.02, "all_reduce_1": 0.05, ...} // key อาจไม่เหมือนกัน
-        # }
+        with self._runs_lock, self._versions_lock:
+            comm_stats = [(name, self._comm_stats[name]) for name in self._runs if name in self._comm_stats]
+
         final_data = {}
-        for run_name, events in collected_durations.items():
+        for run_name, events in comm_stats:
             final_data[run_name] = {}
-            for key, durations in events.items():
-                if durations:
-                    average_duration = sum(durations) / len(durations)
-                    final_data[run_name][key] = round(average_duration, 4)
-        
-        return self.respond_as_json(final_data)
\ No newline at end of file
+            for key, stats in events.items():
+                if stats.count:
+                    final_data[run_name][key] = stats.to_dict() if stat == 'all' else round(stats.value(stat), 4)
+        return final_data
@@ -5,5 +5,7 @@
 # pyre-unsafe
 
 from .loader import RunLoader
+from .parse_pool import ParsePool
+from .profile_cache import ProfileCache
 
-__all__ = ['RunLoader']
+__all__ = ['RunLoader', 'ParsePool', 'ProfileCache']
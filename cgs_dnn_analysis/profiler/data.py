@@ -6,22 +6,25 @@
 import gzip
 import io as sysio
 import json
+import os
 import re
 import tempfile
 from json.decoder import JSONDecodeError
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from .. import io, utils
 from . import trace
 from .event_parser import EventParser
+from .event_table import EventTable, EventTableBuilder
 from .node import OperatorNode
 from .trace import BaseEvent
+from .trace_stream import TraceStreamReader
 
 logger = utils.get_logger()
 
 
 class RunProfileData:
-    def __init__(self, worker: str, span: str, trace_json: Dict):
+    def __init__(self, worker: str, span: str, trace_json: Dict, columnar: bool = False):
         self.worker = worker
         self.span = span
 
@@ -32,9 +35,12 @@ class RunProfileData:
 
         self.profiler_start_ts = float('inf')
         self.events: List[BaseEvent] = []
+        # columnar alternative of `events`, see EventTable
+        self.event_table: Optional[EventTable] = None
 
         trace_body = trace_json['traceEvents']
         fwd_bwd_events = []
+        table_builder = EventTableBuilder() if columnar else None
         for data in trace_body:
             if data.get('cat') == 'fwdbwd':
                 fwd_bwd_events.append(data)
@@ -42,9 +48,15 @@ class RunProfileData:
                 event = trace.create_event(data, self.is_pytorch_lightning)
                 if event is not None:
                     self.profiler_start_ts = min(self.profiler_start_ts, event.ts)
-                    self.events.append(event)
-
-        self.events.sort(key=lambda e: e.ts)
+                    if table_builder is not None:
+                        table_builder.append(event)
+                    else:
+                        self.events.append(event)
+
+        if table_builder is not None:
+            self.event_table = table_builder.build()
+        else:
+            self.events.sort(key=lambda e: e.ts)
         self.forward_backward_events = trace.create_association_events(fwd_bwd_events)
 
         self.trace_file_path: str = None
@@ -54,15 +66,49 @@ class RunProfileData:
 
     @staticmethod
     def parse(worker, span, path, cache_dir):
+        columnar = os.environ.get('TORCH_PROFILER_COLUMNAR_EVENTS', '0') == '1'
+        if os.environ.get('TORCH_PROFILER_STREAMING_PARSE', '1') == '1':
+            try:
+                profile = RunProfileData.from_stream(worker, span, path, columnar)
+                profile.trace_file_path = path
+                return profile
+            except JSONDecodeError as e:
+                logger.warning('Get JSONDecodeError: %s when streaming %s, fall back to full loading' % (e.msg, path))
+
         trace_path, trace_json = RunProfileData._preprocess_file(path, cache_dir)
 
-        profile = RunProfileData.from_json(worker, span, trace_json)
+        profile = RunProfileData.from_json(worker, span, trace_json, columnar)
         profile.trace_file_path = trace_path
         return profile
 
     @staticmethod
-    def from_json(worker, span, trace_json: Dict):
-        profile = RunProfileData(worker, span, trace_json)
+    def from_json(worker, span, trace_json: Dict, columnar: bool = False):
+        profile = RunProfileData(worker, span, trace_json, columnar)
+        with utils.timing('Data processing'):
+            profile.process()
+        return profile
+
+    @staticmethod
+    def from_stream(worker, span, path, columnar: bool = False):
+        """Build the profile while the trace file is being decoded, so that only the converted
+        events are kept in memory instead of the whole json document.
+
+        The 'Record Window End' work-around of _preprocess_file is not needed here: it only
+        matters for the re-encoded trace file, and create_event ignores such instant events.
+        """
+        reader = TraceStreamReader(path)
+        profile = RunProfileData(worker, span, reader.open(), columnar)
+
+        # metadata stored after 'traceEvents' is only known once the events are consumed
+        metadata = reader.metadata
+        if not profile.is_pytorch_lightning and metadata.get('Framework', None) == 'pytorch-lightning':
+            reader = TraceStreamReader(path)
+            profile = RunProfileData(worker, span, dict(reader.open(), Framework='pytorch-lightning'), columnar)
+        if profile.data_schema_version is None:
+            profile.data_schema_version = metadata.get('schemaVersion', None)
+        if profile.device_props is None:
+            profile.device_props = metadata.get('deviceProperties', None)
+
         with utils.timing('Data processing'):
             profile.process()
         return profile
@@ -122,5 +168,7 @@ class RunProfileData:
 
     def process(self):
         with utils.timing('EventParser.parse'):
-            parser = EventParser()
-            self.tid2tree, self.pl_tid2tree = parser.parse(self.events, self.forward_backward_events)
+            # TORCH_PROFILER_COLUMNAR_TREES=1 keeps the trees as compact TreeStores instead of node objects
+            parser = EventParser(os.environ.get('TORCH_PROFILER_COLUMNAR_TREES', '0') == '1')
+            events = self.event_table if self.event_table is not None else self.events
+            self.tid2tree, self.pl_tid2tree = parser.parse(events, self.forward_backward_events)
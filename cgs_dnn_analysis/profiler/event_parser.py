@@ -8,9 +8,12 @@ from collections import defaultdict
 from enum import IntEnum
 from typing import Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
+
 from .. import utils
 from .node import (CommunicationNode, DeviceNode, ModuleNode, OperatorNode, PLModuleNode, PLProfileNode,
-                   ProfilerStepNode, RuntimeNode, create_operator_node)
+                   ProfilerStepNode, RuntimeNode, create_operator_node, runtime_sort_key)
+from .event_table import EventTable
 from .op_tree import OpTreeBuilder
 from .trace import BaseEvent, DurationEvent, EventTypes, KernelEvent, NcclOpNameSet, GlooOpNameSet
 
@@ -23,6 +26,9 @@ class NodeParserMixin:
         self.runtime_node_list: List[RuntimeNode] = []
 
     def parse_nodes(self, events: Iterable[BaseEvent]):
+        if isinstance(events, EventTable):
+            return self._parse_table_nodes(events)
+
         tid2list: Dict[int, List[OperatorNode]] = defaultdict(list)
         pl_tid2list: Dict[int, List[PLProfileNode]] = defaultdict(list)
         tid2zero_rt_list: Dict[int, List[RuntimeNode]] = defaultdict(list)
@@ -42,23 +48,78 @@ class NodeParserMixin:
                 pl_tid2list,
                 tid2zero_rt_list)
 
+        self._associate_runtimes(tid2list, externalid_to_runtime)
+
+        staled_device_nodes = []
+        for device_nodes in corrid_to_device.values():
+            staled_device_nodes.extend([n for n in device_nodes if n.type == EventTypes.KERNEL])
+
+        return tid2list, tid2zero_rt_list, staled_device_nodes, pl_tid2list
+
+    def _parse_table_nodes(self, table: EventTable):
+        """parse_nodes over the columnar events. The device events are joined to their runtimes by
+        correlation id with a few array operations, instead of dict lookups event by event."""
+        tid2list: Dict[int, List[OperatorNode]] = defaultdict(list)
+        pl_tid2list: Dict[int, List[PLProfileNode]] = defaultdict(list)
+        tid2zero_rt_list: Dict[int, List[RuntimeNode]] = defaultdict(list)
+        externalid_to_runtime: Dict[int, List[RuntimeNode]] = defaultdict(list)
+
+        device_rows = np.flatnonzero(table.type_mask(EventTypes.KERNEL, EventTypes.MEMCPY, EventTypes.MEMSET))
+        runtime_rows = np.flatnonzero(table.type_mask(EventTypes.RUNTIME))
+        device_runtimes = join_by_correlation(table.data['correlation_id'], runtime_rows, device_rows)
+        device_nodes = [DeviceNode.create(table.event(row)) for row in device_rows.tolist()]
+
+        # the device nodes of each runtime, split into the ones before and after it like the dict based parsing:
+        # those before are sorted when the RuntimeNode is created, those after are appended in time order.
+        before: Dict[int, List[DeviceNode]] = defaultdict(list)
+        after: Dict[int, List[DeviceNode]] = defaultdict(list)
+        matched = np.flatnonzero(device_runtimes >= 0)
+        is_before = device_rows[matched] < runtime_rows[device_runtimes[matched]]
+        for i, rt, is_before_rt in zip(matched.tolist(), device_runtimes[matched].tolist(), is_before.tolist()):
+            (before if is_before_rt else after)[rt].append(device_nodes[i])
+
+        for rt, row in enumerate(runtime_rows.tolist()):
+            event = table.event(row)
+            rt_node = RuntimeNode.create(event, before.get(rt))
+            if rt in after:
+                rt_node.device_nodes = (rt_node.device_nodes or []) + after[rt]
+            externalid_to_runtime[rt_node.external_id].append(rt_node)
+            if rt_node.external_id == 0:
+                tid2zero_rt_list[event.tid].append(rt_node)
+            self.runtime_node_list.append(rt_node)
+
+        host_rows = np.flatnonzero(~table.type_mask(EventTypes.KERNEL, EventTypes.MEMCPY, EventTypes.MEMSET,
+                                                    EventTypes.RUNTIME, EventTypes.MEMORY))
+        for row in host_rows.tolist():
+            self._parse_node(table.event(row), None, None, None, tid2list, pl_tid2list, tid2zero_rt_list)
+
+        self._associate_runtimes(tid2list, externalid_to_runtime)
+
+        # the device events without runtime, grouped by correlation id in the order the ids first appear
+        staled = np.flatnonzero(device_runtimes < 0)
+        _, first, inverse = np.unique(table.data['correlation_id'][device_rows[staled]],
+                                      return_index=True, return_inverse=True)
+        staled = staled[np.argsort(first[inverse.reshape(-1)], kind='stable')]
+        staled_device_nodes = [device_nodes[i] for i in staled.tolist() if device_nodes[i].type == EventTypes.KERNEL]
+
+        return tid2list, tid2zero_rt_list, staled_device_nodes, pl_tid2list
+
+    @staticmethod
+    def _associate_runtimes(tid2list: Dict[int, List[OperatorNode]],
+                            externalid_to_runtime: Dict[int, List[RuntimeNode]]):
         # associate CUDA Runtimes with CPU events
         for op_list in tid2list.values():
             for op in op_list:
                 runtime_nodes = externalid_to_runtime.pop(op.external_id, [])
                 if runtime_nodes:
                     op.runtimes.extend(runtime_nodes)
+                    # fill_stats relies on the order
+                    op.runtimes.sort(key=runtime_sort_key)
         for ext_id in externalid_to_runtime:
             if ext_id != 0:
                 logger.warning("{} Runtime with external id {} don't correlate to any operator!".format(
                     len(externalid_to_runtime[ext_id]), ext_id))
 
-        staled_device_nodes = []
-        for device_nodes in corrid_to_device.values():
-            staled_device_nodes.extend([n for n in device_nodes if n.type == EventTypes.KERNEL])
-
-        return tid2list, tid2zero_rt_list, staled_device_nodes, pl_tid2list
-
     def _parse_node(self,
                     event: DurationEvent,
                     corrid_to_device: Dict[int, List[DeviceNode]],
@@ -108,16 +169,47 @@ class NodeParserMixin:
             pl_tid2list[int(tid)].append(op_node)
 
 
+def join_by_correlation(correlation_ids: np.ndarray, runtime_rows: np.ndarray, device_rows: np.ndarray) -> np.ndarray:
+    """For every device row, the index into runtime_rows of its runtime, -1 when there is none.
+
+    It is the last runtime with the same correlation id before the device event, otherwise the first one
+    after it, as the dict based parsing assigns them. The rows are ranked by (correlation id, row) in one
+    sorted key array, so every device is resolved by a single searchsorted.
+    """
+    result = np.full(len(device_rows), -1, dtype=np.int64)
+    if not len(runtime_rows) or not len(device_rows):
+        return result
+
+    _, ranks = np.unique(np.concatenate([correlation_ids[runtime_rows], correlation_ids[device_rows]]),
+                         return_inverse=True)
+    ranks = ranks.reshape(-1).astype(np.int64)
+    stride = len(correlation_ids) + 1
+    runtime_keys = ranks[:len(runtime_rows)] * stride + runtime_rows
+    device_ranks = ranks[len(runtime_rows):]
+    order = np.argsort(runtime_keys, kind='stable')
+    sorted_keys = runtime_keys[order]
+
+    position = np.searchsorted(sorted_keys, device_ranks * stride + device_rows)
+    previous = np.maximum(position - 1, 0)
+    has_before = (position > 0) & (sorted_keys[previous] // stride == device_ranks)
+    following = np.minimum(position, len(sorted_keys) - 1)
+    has_after = ~has_before & (position < len(sorted_keys)) & (sorted_keys[following] // stride == device_ranks)
+    result[has_before] = order[previous[has_before]]
+    result[has_after] = order[following[has_after]]
+    return result
+
+
 class EventParser(NodeParserMixin):
-    def __init__(self):
+    def __init__(self, columnar_trees: bool = False):
         super().__init__()
+        self.columnar_trees = columnar_trees
 
     def parse(self, events: Iterable[BaseEvent], fwd_bwd_map: Dict[int, int]) -> Dict[int, List[OperatorNode]]:
         with utils.timing('EventParser: parse nodes'):
             tid2list, tid2zero_rt_list, staled_device_nodes, pl_tid2list = self.parse_nodes(events)
 
         with utils.timing('EventParser: build operator tree'):
-            builder = OpTreeBuilder()
+            builder = OpTreeBuilder(self.columnar_trees)
             tid2tree = builder.build_tree(tid2list, tid2zero_rt_list, staled_device_nodes, fwd_bwd_map=fwd_bwd_map)
             pl_tid2tree = builder.build_tree(pl_tid2list, {}, [], {})
 
@@ -0,0 +1,227 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+import math
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from .trace import (BaseEvent, DurationEvent, EventTypes, KernelEvent, MemoryEvent, ModuleEvent,
+                    OperatorEvent, PLModuleEvent, PLProfileEvent, ProfilerStepEvent,
+                    PythonFunctionEvent)
+
+__all__ = ['EventTable', 'EventTableBuilder']
+
+EVENT_TYPES = (EventTypes.TRACE, EventTypes.OPERATOR, EventTypes.PROFILER_STEP, EventTypes.RUNTIME,
+               EventTypes.KERNEL, EventTypes.MEMCPY, EventTypes.MEMSET, EventTypes.PYTHON, EventTypes.MEMORY,
+               EventTypes.PYTHON_FUNCTION, EventTypes.MODULE, EventTypes.PL_PROFILE, EventTypes.PL_MODULE,
+               EventTypes.USER_ANNOTATION)
+EVENT_TYPE_CODES = {t: i for i, t in enumerate(EVENT_TYPES)}
+
+# Event class -> the attributes kept in the sparse side table of that class.
+# The common attributes (name, ts, duration, pid, tid, ...) are stored in the columns instead.
+_SIDE_FIELDS = {
+    DurationEvent: (),
+    KernelEvent: ('occupancy', 'blocks_per_sm', 'grid', 'block', 'regs_per_thread', 'shared_memory', 'device_id'),
+    OperatorEvent: ('callstack', 'input_type', 'input_shape'),
+    ProfilerStepEvent: ('callstack', 'input_type', 'input_shape', 'step'),
+    MemoryEvent: ('scope', 'device_id', 'device_type', 'addr', 'bytes', 'total_allocated', 'total_reserved'),
+    PythonFunctionEvent: ('python_id', 'python_parent_id'),
+    ModuleEvent: ('python_id', 'python_parent_id', 'module_id'),
+    PLProfileEvent: (),
+    PLModuleEvent: ('module_id', 'module_type'),
+}
+_EVENT_CLASSES = tuple(_SIDE_FIELDS)
+_EVENT_CLASS_CODES = {cls: i for i, cls in enumerate(_EVENT_CLASSES)}
+
+# sentinel of the external_id/correlation_id columns for the missing ids.
+NO_ID = -1
+
+# bits of the flags column, recording which times were integers in the trace
+TS_IS_INT = 1
+DUR_IS_INT = 2
+
+
+class _Interner:
+    def __init__(self):
+        self.ids: Dict = {}
+        self.values: List = []
+
+    def __call__(self, value) -> int:
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class EventTableBuilder:
+    """Collect events row by row into compact typed buffers.
+
+    Each event is flattened into the columns as soon as it is appended, so the event object
+    (and its raw args dict) can be released by the caller right away.
+    """
+
+    def __init__(self):
+        self._names = _Interner()
+        self._categories = _Interner()
+        self._pids = _Interner()
+        self._tids = _Interner()
+        self._ts = array('d')
+        self._dur = array('d')
+        self._name = array('i')
+        self._category = array('i')
+        self._pid = array('i')
+        self._tid = array('i')
+        self._type = array('b')
+        self._kind = array('b')
+        self._flags = array('B')
+        self._external_id = array('q')
+        self._correlation_id = array('q')
+        self._side: Dict[int, Dict[int, Tuple]] = {i: {} for i in range(len(_EVENT_CLASSES))}
+
+    def append(self, event: BaseEvent):
+        row = len(self._ts)
+        kind = _EVENT_CLASS_CODES[type(event)]
+        self._kind.append(kind)
+        self._type.append(EVENT_TYPE_CODES[event.type])
+        self._name.append(self._names(event.name))
+        self._pid.append(self._pids(event.pid))
+        self._tid.append(self._tids(event.tid))
+        self._ts.append(_time(event.ts))
+        flags = TS_IS_INT if type(event.ts) is int else 0
+
+        if isinstance(event, DurationEvent):
+            self._dur.append(_time(event.duration))
+            flags |= DUR_IS_INT if type(event.duration) is int else 0
+            self._category.append(self._categories(event.category))
+            self._external_id.append(NO_ID if event.external_id is None else event.external_id)
+            self._correlation_id.append(NO_ID if event.correlation_id is None else event.correlation_id)
+        else:
+            self._dur.append(math.nan)
+            self._category.append(NO_ID)
+            self._external_id.append(NO_ID)
+            self._correlation_id.append(NO_ID)
+        self._flags.append(flags)
+
+        fields = _SIDE_FIELDS[type(event)]
+        if fields:
+            self._side[kind][row] = tuple(getattr(event, f) for f in fields)
+
+    def build(self) -> 'EventTable':
+        """Freeze the buffers into an EventTable ordered by timestamp."""
+        ts = np.frombuffer(self._ts, dtype=np.float64)
+        # stable, so that the events with the same timestamp keep the file order like list.sort
+        order = np.argsort(ts, kind='stable')
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+
+        columns = {
+            'ts': ts,
+            'dur': np.frombuffer(self._dur, dtype=np.float64),
+            'name': np.frombuffer(self._name, dtype=np.int32),
+            'category': np.frombuffer(self._category, dtype=np.int32),
+            'pid': np.frombuffer(self._pid, dtype=np.int32),
+            'tid': np.frombuffer(self._tid, dtype=np.int32),
+            'type': np.frombuffer(self._type, dtype=np.int8),
+            'kind': np.frombuffer(self._kind, dtype=np.int8),
+            'flags': np.frombuffer(self._flags, dtype=np.uint8),
+            'external_id': np.frombuffer(self._external_id, dtype=np.int64),
+            'correlation_id': np.frombuffer(self._correlation_id, dtype=np.int64),
+        }
+        data = np.empty(len(order), dtype=EventTable.DTYPE)
+        for key, column in columns.items():
+            data[key] = column[order]
+        side = {kind: {int(inverse[row]): values for row, values in rows.items()}
+                for kind, rows in self._side.items()}
+
+        return EventTable(data, side, self._names.values, self._categories.values,
+                          self._pids.values, self._tids.values)
+
+
+class EventTable:
+    """Columnar representation of the trace events, sorted by timestamp.
+
+    The common fields live in one NumPy structured array, strings are interned into lookup
+    lists, and the class specific fields (kernel launch arguments, operator shapes, ...) are kept
+    in sparse per-class side tables keyed by row. Iterating the table materializes the regular
+    event objects on the fly, so the existing parsers can consume it unchanged.
+    """
+    DTYPE = np.dtype([
+        ('ts', np.float64),
+        ('dur', np.float64),
+        ('name', np.int32),
+        ('category', np.int32),
+        ('pid', np.int32),
+        ('tid', np.int32),
+        ('type', np.int8),
+        ('kind', np.int8),
+        ('flags', np.uint8),
+        ('external_id', np.int64),
+        ('correlation_id', np.int64),
+    ])
+
+    def __init__(self, data: np.ndarray, side: Dict[int, Dict[int, Tuple]], names: List[str],
+                 categories: List[str], pids: List, tids: List):
+        self.data = data
+        self.side = side
+        self.names = names
+        self.categories = categories
+        self.pids = pids
+        self.tids = tids
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self) -> Iterator[BaseEvent]:
+        for row in range(len(self.data)):
+            yield self.event(row)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def type_mask(self, *types: str) -> np.ndarray:
+        """Boolean mask of the rows whose event type is one of `types`."""
+        return np.isin(self.data['type'], [EVENT_TYPE_CODES[t] for t in types])
+
+    def event(self, row: int) -> BaseEvent:
+        """Materialize the event object of the given row."""
+        record = self.data[row]
+        kind = int(record['kind'])
+        cls = _EVENT_CLASSES[kind]
+        event = cls.__new__(cls)
+        event.type = EVENT_TYPES[record['type']]
+        event.name = self.names[record['name']]
+        flags = int(record['flags'])
+        event.ts = _restore_time(record['ts'], flags & TS_IS_INT)
+        event.pid = self.pids[record['pid']]
+        event.tid = self.tids[record['tid']]
+
+        if issubclass(cls, DurationEvent):
+            event.category = self.categories[record['category']]
+            event.duration = _restore_time(record['dur'], flags & DUR_IS_INT)
+            external_id = int(record['external_id'])
+            event.external_id = None if external_id == NO_ID else external_id
+            correlation_id = int(record['correlation_id'])
+            event.correlation_id = None if correlation_id == NO_ID else correlation_id
+
+        fields = _SIDE_FIELDS[cls]
+        if fields:
+            for field, value in zip(fields, self.side[kind][row]):
+                setattr(event, field, value)
+        return event
+
+
+def _time(t) -> float:
+    return math.nan if t is None else t
+
+
+def _restore_time(t, is_int: bool):
+    t = float(t)
+    if math.isnan(t):
+        return None
+    return int(t) if is_int else t
@@ -5,30 +5,49 @@
 # --------------------------------------------------------------------------
 import os
 import sys
+from collections import namedtuple
+from typing import Dict, Optional
 
 from .. import consts, io, utils
+from ..matchers import load_run_matcher
 # For simplicity, we will assume single process and not use the custom multiprocessing
 # from ..multiprocessing import Process, Queue
-from multiprocessing import Process, Queue
+from multiprocessing import Queue
 from ..run import Run, RunProfile
 from .data import RunProfileData
+from .parse_pool import ParsePool
+from .profile_cache import ProfileCache
 from .run_generator import RunGenerator
 
 logger = utils.get_logger()
 
+# what a worker profile was parsed from: the trace file name, its StatData and the matcher profile fingerprint
+Fingerprint = namedtuple('Fingerprint', ['path', 'stat', 'matcher'])
+
 
 class RunLoader:
-    def __init__(self, name, run_dir, caches: io.Cache):
+    def __init__(self, name, run_dir, caches: io.Cache, profile_cache: ProfileCache = None,
+                 pool: ParsePool = None):
         self.run_name = name
         self.run_dir = run_dir
         self.caches = caches
+        self.profile_cache = profile_cache
+        # the plugin shares one pool between all the runs, so the parse processes are bounded globally
+        self.pool = pool if pool is not None else ParsePool.from_env()
         self.queue = Queue()
+        self.matcher = None
 
-    def load(self):
+    def load(self, previous: Optional[Run] = None, files: Optional[Dict[str, Optional[io.StatData]]] = None):
+        """Load the run. The profiles of previous whose trace file has the same fingerprint are reused, only
+        the new and changed worker files are parsed. files is the listing of the trace files of the run
+        directory (file name -> StatData) when the caller already has it."""
+        # the operations of the steps are recognized by the matcher profile of the run
+        self.matcher = load_run_matcher(self.run_dir)
+        logger.info('Run %s uses matcher profile %s', self.run_name, self.matcher.name)
         workers = []
         # Span processing is removed for simplicity.
-        for path in io.listdir(self.run_dir):
-            if io.isdir(io.join(self.run_dir, path)):
+        for path in sorted(files) if files is not None else io.listdir(self.run_dir):
+            if files is None and io.isdir(io.join(self.run_dir, path)):
                 continue
             match = consts.WORKER_PATTERN.match(path)
             if not match:
@@ -38,42 +57,71 @@ class RunLoader:
             # span is ignored.
             workers.append((worker, None, path))
 
+        run = Run(self.run_name, self.run_dir, self.matcher)
+        fingerprints = {}
+        scheduled = 0
         for worker, span, path in workers:
+            stat = files.get(path) if files is not None else None
+            stat = stat or self._stat(path)
+            # without a content version a rewritten file of the same size would not be noticed
+            fingerprints[worker] = Fingerprint(path, stat, self.matcher.fingerprint) \
+                if stat is not None and stat.version is not None else None
+            if previous is not None and fingerprints[worker] is not None and \
+                    previous.fingerprints.get(worker) == fingerprints[worker] and previous.get_profile(worker):
+                run.add_profile(previous.get_profile(worker))
+                continue
             # Simplified: no more span_index
-            p = Process(target=self._process_data, args=(worker, span, path))
-            p.start()
-        logger.info('started all processing')
+            self.pool.submit(self.run_name, self._process_data, (worker, span, path),
+                             ParsePool.estimate_memory(path, stat.length or 0) if stat is not None else 0,
+                             on_failure=lambda: self.queue.put(None))
+            scheduled += 1
+        logger.info('scheduled %d of %d workers', scheduled, len(workers))
 
-        run = Run(self.run_name, self.run_dir)
-        num_items = len(workers)
+        num_items = scheduled
         while num_items > 0:
             profile: RunProfile = self.queue.get()
             num_items -= 1
             if profile is not None:
                 logger.debug('Loaded profile via mp.Queue')
                 run.add_profile(profile)
+        run.fingerprints = {worker: fingerprint for worker, fingerprint in fingerprints.items()
+                            if worker in run.profiles}
 
-        # for no daemon process, no need to join them since it will automatically join
+        # the pool joins the processes
         return run
 
+    def _stat(self, path) -> Optional[io.StatData]:
+        try:
+            return io.stat(io.join(self.run_dir, path))
+        except Exception as ex:
+            logger.debug('Failed to stat %s. Exception=%s', path, ex)
+            return None
+
     def _process_data(self, worker, span, path):
         # pyre-fixme[21]: Could not find module `absl.logging`.
         import absl.logging
         absl.logging.use_absl_handler()
 
         try:
-            logger.debug('Parse trace, run_dir=%s, worker=%s', self.run_dir, path)
-            # Caching mechanism is kept, but can be simplified if only local files are used.
-            local_file = self.caches.get_remote_cache(io.join(self.run_dir, path))
-            data = RunProfileData.parse(worker, span, local_file, self.caches.cache_dir)
-            if data.trace_file_path != local_file:
-                self.caches.add_file(local_file, data.trace_file_path)
+            trace_path = io.join(self.run_dir, path)
+            cache_key = self.profile_cache.key(trace_path, self.matcher.fingerprint) if self.profile_cache else None
+            profile = self._load_cached_profile(worker, span, cache_key)
+            if profile is None:
+                logger.debug('Parse trace, run_dir=%s, worker=%s', self.run_dir, path)
+                # Caching mechanism is kept, but can be simplified if only local files are used.
+                local_file = self.caches.get_remote_cache(trace_path)
+                data = RunProfileData.parse(worker, span, local_file, self.caches.cache_dir)
+                if data.trace_file_path != local_file:
+                    self.caches.add_file(local_file, data.trace_file_path)
 
-            generator = RunGenerator(worker, span, data)
-            profile = generator.generate_run_profile()
+                generator = RunGenerator(worker, span, data)
+                profile = generator.generate_run_profile()
+                # extract the steps here rather than in the plugin process
+                profile.get_operator_tree(self.matcher)
+                self._save_cached_profile(cache_key, profile)
 
             logger.debug('Sending back profile via mp.Queue')
-            self.queue.put(profile)
+            self.queue.put(profile.compact())
         except KeyboardInterrupt:
             logger.warning('tb_plugin receive keyboard interrupt signal, process %d will exit' % (os.getpid()))
             sys.exit(1)
@@ -82,3 +130,25 @@ class RunLoader:
                            self.run_name, worker, ex, exc_info=True)
             self.queue.put(None)
         logger.debug('finishing process data')
+
+    def _load_cached_profile(self, worker, span, cache_key):
+        if cache_key is None:
+            return None
+        value = self.profile_cache.get(cache_key)
+        if value is None:
+            return None
+
+        logger.debug('Load profile from cache, run_dir=%s, worker=%s', self.run_dir, worker)
+        profile = RunProfile(worker, span)
+        profile.operator_tree = value['operator_tree']
+        return profile
+
+    def _save_cached_profile(self, cache_key, profile: RunProfile):
+        if cache_key is None:
+            return
+        # only the step-level result, the full operator trees are never read back
+        value = {'operator_tree': profile.get_operator_tree()}
+        try:
+            self.profile_cache.put(cache_key, value)
+        except Exception as ex:
+            logger.warning('Failed to cache the profile of %s. Exception=%s', profile.worker, ex)
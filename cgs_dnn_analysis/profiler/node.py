@@ -18,6 +18,9 @@ ExcludeOpName = ['DataParallel.forward', 'DistributedDataParallel.forward']
 
 
 class BaseNode(ABC):
+    # The trees hold millions of nodes, so the node classes use __slots__ instead of instance dicts.
+    __slots__ = ('name', 'start_time', 'end_time', 'type', 'tid', 'external_id')
+
     def __init__(self, name: str, start_time: int, end_time: int, type: str, tid: int,
                  external_id: Optional[int] = None):
         self.name = name
@@ -63,6 +66,9 @@ class BaseNode(ABC):
 
 
 class CommunicationNode(BaseNode):
+    __slots__ = ('input_shape', 'input_type', 'kernel_ranges', 'real_time_ranges', 'total_time', 'real_time',
+                 'step_name')
+
     def __init__(self, input_shape: List[List[int]], input_type: List[str], **kwargs):
         super().__init__(**kwargs)
         self.input_shape = input_shape
@@ -81,6 +87,8 @@ class CommunicationNode(BaseNode):
 
 
 class HostNode(BaseNode):
+    __slots__ = ('device_duration',)
+
     def __init__(self, device_duration: int = 0, **kwargs):
         super().__init__(**kwargs)
         self.device_duration = device_duration  # Total time of Kernel, GPU Memcpy, GPU Memset. TODO: parallel multi-stream? # noqa: E501
@@ -93,6 +101,9 @@ class HostNode(BaseNode):
 
 
 class OperatorNode(HostNode):
+    __slots__ = ('children', 'runtimes', 'input_shape', 'input_type', 'callstack', 'self_host_duration',
+                 'self_device_duration', 'tc_eligible', 'tc_self_duration', 'tc_total_duration')
+
     # Don't use [] as default parameters
     # https://stackoverflow.com/questions/1132941/least-astonishment-and-the-mutable-default-argument?page=1&tab=votes#tab-top
     # https://web.archive.org/web/20200221224620/http://effbot.org/zone/default-values.htm
@@ -131,13 +142,24 @@ class OperatorNode(HostNode):
         return result
 
     def fill_stats(self):
-        # TODO: Replace recursive by using a stack, in case of too deep callstack.
-        self.children.sort(key=lambda x: (x.start_time, -x.end_time))
-        self.runtimes.sort(key=lambda x: (x.start_time, -x.end_time)
-                           if x.start_time and x.end_time else (sys.maxsize, -sys.maxsize - 1))
+        """Fill the statistics of the whole subtree in one bottom-up sweep.
 
-        for child in self.children:
-            child.fill_stats()
+        It is iterative, so deep callstacks (e.g. with_stack=True traces) don't hit the recursion limit.
+        The children and runtimes are expected in node_sort_key/runtime_sort_key order, which
+        OpTreeBuilder establishes when it builds the tree.
+        """
+        # pre-order with an explicit stack; its reverse visits every node after all of its descendants
+        nodes: List[OperatorNode] = []
+        stack: List[OperatorNode] = [self]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(node.children)
+        for node in reversed(nodes):
+            node.fill_self_stats()
+
+    def fill_self_stats(self):
+        """Fill the statistics of this node from its runtimes and its already filled children."""
         for rt in self.runtimes:
             rt.fill_stats(self)
 
@@ -184,19 +206,23 @@ class OperatorNode(HostNode):
 
 
 class ProfilerStepNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
 
 class ModuleNode(OperatorNode):
+    __slots__ = ('module_id', 'python_id', 'python_parent_id')
+
     def __init__(self, module_id: int, python_id: int, python_parent_id: int, **kwargs):
         super().__init__(**kwargs)
         self.module_id = module_id
         self.python_id = python_id
         self.python_parent_id = python_parent_id
 
-    def fill_stats(self):
-        super().fill_stats()
+    def fill_self_stats(self):
+        super().fill_self_stats()
         self.self_device_duration += get_chilren_self_device_time(self)
 
     @classmethod
@@ -214,13 +240,20 @@ class ModuleNode(OperatorNode):
 
 
 class BackwardNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
     def fill_stats(self):
+        """The children are filled already, so only fill this node."""
+        self.fill_self_stats()
+
+    def fill_self_stats(self):
         """Override the timestamps and duration for BackwardNode only
         """
-        self.children.sort(key=lambda x: (x.start_time, -x.end_time))
+        # the children are gathered from several forward operators, so they are not in order yet
+        self.children.sort(key=node_sort_key)
         self.start_time = self.children[0].start_time
         self.end_time = self.children[-1].end_time
 
@@ -235,6 +268,8 @@ class BackwardNode(OperatorNode):
 
 
 class PLProfileNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -247,12 +282,14 @@ class PLProfileNode(OperatorNode):
 
 
 class PLModuleNode(OperatorNode):
+    __slots__ = ('module_id',)
+
     def __init__(self, module_id: int, **kwargs):
         super().__init__(**kwargs)
         self.module_id = module_id
 
-    def fill_stats(self):
-        super().fill_stats()
+    def fill_self_stats(self):
+        super().fill_self_stats()
         self.self_device_duration += get_chilren_self_device_time(self)
 
     @classmethod
@@ -266,20 +303,26 @@ class PLModuleNode(OperatorNode):
 
 
 class DataLoaderNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
 
 class OptimizerNode(OperatorNode):
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
 
 class RuntimeNode(HostNode):
+    __slots__ = ('device_nodes', 'tc_duration')
+
     def __init__(self, device_nodes: Optional[List['DeviceNode']] = None, **kwargs):
         super().__init__(**kwargs)
         # One runtime could trigger more than one kernel, such as cudaLaunchCooperativeKernelMultiDevice.
-        self.device_nodes = sorted(device_nodes, key=lambda x: (x.start_time, -x.end_time)) if device_nodes else None
+        self.device_nodes = sorted(device_nodes, key=node_sort_key) if device_nodes else None
         self.tc_duration: int = 0  # Time summarization of all its launched kernels.
     
     def to_dict(self):
@@ -315,6 +358,9 @@ class RuntimeNode(HostNode):
 
 
 class DeviceNode(BaseNode):
+    __slots__ = ('op_tc_eligible', 'op_name', 'blocks_per_sm', 'occupancy', 'grid', 'block', 'regs_per_thread',
+                 'shared_memory', 'tc_used', 'device_id')
+
     def __init__(self,
                  blocks_per_sm: Optional[float] = None,
                  # pyre-fixme[9]: occupancy has type `int`; used as `None`.
@@ -370,6 +416,16 @@ class DeviceNode(BaseNode):
         return cls(**kwargs)
 
 
+def node_sort_key(node: BaseNode):
+    # Note that when 2 start_time are equal, the one with bigger end_time should be ahead of the other.
+    return node.start_time, -node.end_time
+
+
+def runtime_sort_key(node: BaseNode):
+    # the runtimes without time (the dummy runtime of the staled kernels) go last
+    return (node.start_time, -node.end_time) if node.start_time and node.end_time else (sys.maxsize, -sys.maxsize - 1)
+
+
 def create_operator_node(event: OperatorEvent):
     if (event.name.startswith('enumerate(DataLoader)#') and event.name.endswith('.__next__')
             or event.name.startswith('enumerate(DataPipe)#')):
@@ -9,8 +9,9 @@ from typing import Dict, Iterable, List, Optional, Tuple
 
 from .. import utils
 from .node import (BackwardNode, DeviceNode, ModuleNode, OperatorNode,
-                   ProfilerStepNode, RuntimeNode, is_operator_node)
+                   ProfilerStepNode, RuntimeNode, is_operator_node, node_sort_key, runtime_sort_key)
 from .trace import EventTypes
+from .tree_store import TreeStore
 
 logger = utils.get_logger()
 
@@ -19,15 +20,29 @@ class OpTreeBuilder:
     BACKWARD_ROOT_PREFIX = 'autograd::engine::evaluate_function:'
     BACKWARD_ACCUMULATE_GRAD = 'autograd::engine::evaluate_function: torch::autograd::AccumulateGrad'
 
-    def __init__(self):
+    def __init__(self, columnar: bool = False):
         self.main_tid: int = None
         self.tid2tree: Dict[int, OperatorNode] = None
+        # pack the built trees into TreeStores and return their root views, see tree_store.py
+        self.columnar = columnar
 
     def build_tree(self,
                    tid2list: Dict[int, List[OperatorNode]],
                    tid2zero_rt_list: Dict[int, List[RuntimeNode]],
                    staled_device_nodes: List[DeviceNode],
                    fwd_bwd_map: Dict[int, int]):
+        """Build the operator tree of each thread, packed into a TreeStore when columnar."""
+        tid2tree = self._build_node_tree(tid2list, tid2zero_rt_list, staled_device_nodes, fwd_bwd_map)
+        if self.columnar:
+            # the node objects are released once packed
+            self.tid2tree = {tid: TreeStore(root).root for tid, root in tid2tree.items()}
+        return self.tid2tree
+
+    def _build_node_tree(self,
+                         tid2list: Dict[int, List[OperatorNode]],
+                         tid2zero_rt_list: Dict[int, List[RuntimeNode]],
+                         staled_device_nodes: List[DeviceNode],
+                         fwd_bwd_map: Dict[int, int]):
         """Construct the BackwardNode and replace the original backward nodes
         """
         self.tid2tree = self._build_tree(tid2list, tid2zero_rt_list, staled_device_nodes)
@@ -43,9 +58,9 @@ class OpTreeBuilder:
         if not modules or not backward_nodes:
             return self.tid2tree
 
-        _, ts2parent = OpTreeBuilder._get_node_parents(backward_nodes)
+        ts2roots = OpTreeBuilder._get_backward_root_index(backward_nodes)
         agg_nodes = OpTreeBuilder._group_backward_nodes(backward_nodes)
-        fwd_bwd_root = self._get_backward_roots(fwd_bwd_map, ts2parent, agg_nodes)
+        fwd_bwd_root = self._get_backward_roots(fwd_bwd_map, ts2roots, agg_nodes)
         if len(agg_nodes) > 0:
             logger.warning('some nodes cannot find forward nodes')
 
@@ -62,8 +77,8 @@ class OpTreeBuilder:
 
         for tid, op_list in tid2list.items():
             zero_rt_list = tid2zero_rt_list[tid] if tid in tid2zero_rt_list else []
-            # Note that when 2 start_time are equal, the one with bigger end_time should be ahead of the other.
-            op_list.sort(key=lambda x: (x.start_time, -x.end_time))
+            # The children of every node keep this order, fill_stats relies on it.
+            op_list.sort(key=node_sort_key)
             main_tid = any([op.name.startswith('ProfilerStep#') for op in op_list])
             if main_tid:
                 # only append the staled device nodes into main thread
@@ -122,7 +137,8 @@ class OpTreeBuilder:
                 end_time=sys.maxsize,
                 type=EventTypes.PYTHON,
                 tid=tid,
-                runtimes=zero_rt_list + dummpy_rt)  # Give the list of RuntimeNode with external_id=0 to root node.
+                # Give the list of RuntimeNode with external_id=0 to root node.
+                runtimes=sorted(zero_rt_list + dummpy_rt, key=runtime_sort_key))
             node_stack.append(root_node)
             for node in host_node_list:
                 while True:  # break loop when the node is inserted.
@@ -145,20 +161,21 @@ class OpTreeBuilder:
         # Merge the consecutive calls to same function into one.
         # Just follow the same pattern in torch/autograd/profiler.py,
         # EventList._remove_dup_nodes
-        # TODO: Replace recursive by for loop, in case of too deep callstack.
-        def remove_dup_nodes(node: OperatorNode):
-            if node.type == EventTypes.RUNTIME:
-                return
-            if len(node.children) == 1:
-                child = node.children[0]
-                if node.name == child.name and node.type == EventTypes.OPERATOR and child.type == EventTypes.OPERATOR:
+        def remove_dup_nodes(root: OperatorNode):
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                if node.type == EventTypes.RUNTIME:
+                    continue
+                while len(node.children) == 1:
+                    child = node.children[0]
+                    if not (node.name == child.name and node.type == EventTypes.OPERATOR
+                            and child.type == EventTypes.OPERATOR):
+                        break
                     node.children = child.children
                     node.runtimes = child.runtimes  # Keep consistent with autograd profiler.
-                    remove_dup_nodes(node)  # This node may have to merge with child's child.
-                    return
-
-            for child in node.children:
-                remove_dup_nodes(child)
+                    # This node may have to merge with child's child.
+                stack.extend(node.children)
 
         root_node = build_tree_relationship(host_node_list, zero_rt_list, staled_device_nodes)
         remove_dup_nodes(root_node)
@@ -179,27 +196,24 @@ class OpTreeBuilder:
         modules: List[ModuleNode] = []
         backward_nodes: Dict[OperatorNode, List[OperatorNode]] = defaultdict(list)
 
-        def traverse_node(parent, node: OperatorNode):
+        # one pre-order traversal, descending only into the ProfilerStepNodes
+        stack = [(root, child) for root in self.tid2tree.values() for child in root.children][::-1]
+        while stack:
+            parent, node = stack.pop()
             if isinstance(node, ModuleNode):
                 modules.append(node)
             elif isinstance(node, ProfilerStepNode):
-                for child in node.children:
-                    traverse_node(node, child)
-            else:
-                if node.name.startswith(OpTreeBuilder.BACKWARD_ROOT_PREFIX):
-                    backward_nodes[parent].append(node)
-                else:
-                    pass
-
-        for root in self.tid2tree.values():
-            for child in root.children:
-                traverse_node(root, child)
+                stack.extend((node, child) for child in reversed(node.children))
+            elif node.name.startswith(OpTreeBuilder.BACKWARD_ROOT_PREFIX):
+                backward_nodes[parent].append(node)
 
         if modules:
             backward_nodes_flatten: List[OperatorNode] = []
             # only remove the backward nodes when the module information exist
             for p, nodes in backward_nodes.items():
-                p.children = [child for child in p.children if child not in nodes]
+                # by identity, in a single pass over the children
+                removed = {id(node) for node in nodes}
+                p.children = [child for child in p.children if id(child) not in removed]
                 backward_nodes_flatten.extend(nodes)
 
             return modules, backward_nodes_flatten
@@ -209,22 +223,29 @@ class OpTreeBuilder:
             return None, None
 
     @staticmethod
-    def _get_node_parents(nodes: Iterable[OperatorNode]):
-        """Get the child->parent relationship for these nodes"""
-        ts_to_node: Dict[int, OperatorNode] = {}
-        ts_to_parent: Dict[int, OperatorNode] = {}
-
-        def traverse_node(node: OperatorNode):
-            if node.start_time not in ts_to_node:
-                ts_to_node[node.start_time] = node
-            for child in node.children:
-                if child.start_time not in ts_to_parent:
-                    ts_to_parent[child.start_time] = node
-                traverse_node(child)
+    def _get_backward_root_index(nodes: Iterable[OperatorNode]) -> Dict[int, List[OperatorNode]]:
+        """Get start_time -> the nearest backward roots above the nodes starting at that time.
 
-        for node in nodes:
-            traverse_node(node)
-        return ts_to_node, ts_to_parent
+        The nodes are numbered in pre-order with a parent id array, so the nearest backward root of each
+        node is resolved once from its parent's. The nodes sharing a timestamp are all kept rather than aliased.
+        """
+        parent_ids: List[int] = []
+        nearest_roots: List[Optional[OperatorNode]] = []
+        ts_to_roots: Dict[int, List[OperatorNode]] = defaultdict(list)
+
+        stack = [(node, -1) for node in reversed(list(nodes))]
+        while stack:
+            node, parent_id = stack.pop()
+            node_id = len(parent_ids)
+            parent_ids.append(parent_id)
+            parent_root = nearest_roots[parent_id] if parent_id >= 0 else None
+            if parent_root is not None:
+                roots = ts_to_roots[node.start_time]
+                if not any(root is parent_root for root in roots):
+                    roots.append(parent_root)
+            nearest_roots.append(node if node.name.startswith(OpTreeBuilder.BACKWARD_ROOT_PREFIX) else parent_root)
+            stack.extend((child, node_id) for child in reversed(node.children))
+        return ts_to_roots
 
     @staticmethod
     def _group_backward_nodes(nodes: Iterable[OperatorNode]) -> Dict[OperatorNode, List[OperatorNode]]:
@@ -245,7 +266,7 @@ class OpTreeBuilder:
 
     @staticmethod
     def _get_backward_roots(fwd_bwd_map: Dict[int, int],
-                            ts2parent: Dict[int, OperatorNode],
+                            ts2roots: Dict[int, List[OperatorNode]],
                             backward_nodes: Dict[OperatorNode, List[OperatorNode]]) -> Dict[int, List[OperatorNode]]:
         if not fwd_bwd_map:
             # pyre-fixme[7]: Expected `Dict[int, List[OperatorNode]]` but got `None`.
@@ -253,14 +274,17 @@ class OpTreeBuilder:
 
         fwd_to_bwdroot: Dict[int, List[OperatorNode]] = {}
         for fwd, bwd in fwd_bwd_map.items():
-            parent = ts2parent.get(bwd)
-            while parent is not None and not parent.name.startswith(OpTreeBuilder.BACKWARD_ROOT_PREFIX):
-                parent = ts2parent.get(parent.start_time)
+            roots = ts2roots.get(bwd)
+            if not roots:
+                logger.warning('parent is None for %s', bwd)
+                continue
 
-            if parent:
-                fwd_to_bwdroot[fwd] = backward_nodes.pop(parent)
+            # when the timestamp is shared by several backward roots, take the first one still unmatched
+            root = next((root for root in roots if root in backward_nodes), None)
+            if root is not None:
+                fwd_to_bwdroot[fwd] = backward_nodes.pop(root)
             else:
-                logger.warning('parent is None for', bwd)
+                logger.warning('the backward root of %s is matched already', bwd)
 
         return fwd_to_bwdroot
 
@@ -302,7 +326,7 @@ class OpTreeBuilder:
 
     @staticmethod
     def _insert_backward_modules(root: OperatorNode, backward_modules: List[BackwardNode]):
-        backward_modules.sort(key=lambda x: (x.start_time, -x.end_time))
+        backward_modules.sort(key=node_sort_key)
         node_stack = []
         module_index = 0
         child_index = 0
@@ -0,0 +1,137 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+import heapq
+import itertools
+import os
+import threading
+from multiprocessing import Process
+from typing import Callable, List, Optional, Tuple
+
+from .. import utils
+
+__all__ = ['ParsePool']
+
+logger = utils.get_logger()
+
+# Rough peak memory of a parse process per byte of trace file. A json trace expands about twice
+# into event objects and trees, and a gzip trace is typically 10x smaller than its json.
+_PARSE_MEMORY_FACTOR = 2
+_GZIP_EXPANSION = 10
+
+
+class _Job:
+    def __init__(self, run_name: str, target: Callable, args: Tuple, estimated_bytes: int,
+                 on_failure: Optional[Callable[[], None]]):
+        self.run_name = run_name
+        self.target = target
+        self.args = args
+        self.estimated_bytes = estimated_bytes
+        self.on_failure = on_failure
+
+
+class ParsePool:
+    """Bounded pool of parse processes shared by all the runs.
+
+    Every trace file is parsed in its own short-lived process, so the memory of a parse is returned to
+    the OS when it finishes, but at most max_workers processes run at the same time and the estimated
+    memory of the running parses stays within memory_budget (a single parse is always admitted).
+    Pending jobs of the run the user is currently viewing are started first.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, memory_budget: Optional[int] = None):
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.memory_budget = memory_budget if memory_budget is not None else _default_memory_budget()
+
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[int, int, _Job]] = []
+        self._counter = itertools.count()
+        self._running = 0
+        self._running_bytes = 0
+        self._focused_run: Optional[str] = None
+
+        dispatcher = threading.Thread(target=self._dispatch, name='parse_pool', daemon=True)
+        dispatcher.start()
+
+    @staticmethod
+    def from_env() -> 'ParsePool':
+        """Create the pool configured by TORCH_PROFILER_MAX_WORKERS and TORCH_PROFILER_PARSE_MEMORY_BUDGET."""
+        max_workers = os.environ.get('TORCH_PROFILER_MAX_WORKERS')
+        memory_budget = os.environ.get('TORCH_PROFILER_PARSE_MEMORY_BUDGET')
+        return ParsePool(int(max_workers) if max_workers else None,
+                         int(memory_budget) if memory_budget else None)
+
+    @staticmethod
+    def estimate_memory(path: str, file_size: int) -> int:
+        expansion = _GZIP_EXPANSION if path.endswith('.gz') else 1
+        return file_size * expansion * _PARSE_MEMORY_FACTOR
+
+    def submit(self, run_name: str, target: Callable, args: Tuple, estimated_bytes: int = 0,
+               on_failure: Optional[Callable[[], None]] = None):
+        """Schedule target(*args) in a new process. on_failure is called if the process dies abnormally."""
+        job = _Job(run_name, target, args, estimated_bytes, on_failure)
+        with self._cond:
+            heapq.heappush(self._pending, (self._priority(run_name), next(self._counter), job))
+            self._cond.notify_all()
+
+    def prioritize(self, run_name: str):
+        """Start the pending jobs of run_name before the others."""
+        with self._cond:
+            if run_name == self._focused_run:
+                return
+            self._focused_run = run_name
+            self._pending = [(self._priority(job.run_name), seq, job) for _, seq, job in self._pending]
+            heapq.heapify(self._pending)
+
+    @property
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _priority(self, run_name: str) -> int:
+        return 0 if run_name == self._focused_run else 1
+
+    def _admissible(self, job: _Job) -> bool:
+        if self._running >= self.max_workers:
+            return False
+        return self._running == 0 or self._running_bytes + job.estimated_bytes <= self.memory_budget
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._pending or not self._admissible(self._pending[0][2]):
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._pending)
+                self._running += 1
+                self._running_bytes += job.estimated_bytes
+            threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _run(self, job: _Job):
+        try:
+            p = Process(target=job.target, args=job.args)
+            p.start()
+            p.join()
+            failed = p.exitcode != 0
+            if failed:
+                logger.warning('Parse process of run %s exited with code %s', job.run_name, p.exitcode)
+        except Exception as ex:
+            logger.warning('Failed to start parse process of run %s. Exception=%s', job.run_name, ex, exc_info=True)
+            failed = True
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._running_bytes -= job.estimated_bytes
+                self._cond.notify_all()
+
+        if failed and job.on_failure is not None:
+            job.on_failure()
+
+
+def _default_memory_budget() -> int:
+    """Half of the physical memory, or unlimited when it cannot be determined."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2
+    except (AttributeError, ValueError, OSError):
+        return 2 ** 63 - 1
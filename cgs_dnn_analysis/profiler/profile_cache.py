@@ -0,0 +1,130 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from typing import Any, Optional
+
+from .. import __version__, io, utils
+
+__all__ = ['ProfileCache']
+
+logger = utils.get_logger()
+
+# Bump it whenever the layout of the cached values changes.
+CACHE_FORMAT_VERSION = 1
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+_ENTRY_SUFFIX = '.profile'
+
+
+class ProfileCache:
+    """On-disk cache of the per-worker parse results which survives TensorBoard restarts.
+
+    Entries are keyed by the trace path, its size, its content version (mtime or etag) and the plugin
+    version, so a modified trace or an upgraded plugin never sees a stale entry. Values are stored as
+    zlib compressed pickles, one file per entry, and the least recently used entries are evicted once
+    the total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def from_env() -> Optional['ProfileCache']:
+        """Create the cache configured by TORCH_PROFILER_CACHE_DIR and TORCH_PROFILER_CACHE_MAX_BYTES.
+        An empty TORCH_PROFILER_CACHE_DIR disables the cache."""
+        default_dir = os.path.join(os.path.expanduser('~'), '.cache', 'cgs_dnn_analysis')
+        cache_dir = os.environ.get('TORCH_PROFILER_CACHE_DIR', default_dir)
+        if not cache_dir:
+            return None
+        max_bytes = int(os.environ.get('TORCH_PROFILER_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        return ProfileCache(cache_dir, max_bytes)
+
+    def key(self, trace_path: str, *extra: str) -> Optional[str]:
+        """Return the cache key of the trace file, or None if its version cannot be determined.
+        `extra` are the other inputs of the parse result, e.g. the matcher profile fingerprint."""
+        try:
+            stat = io.stat(trace_path)
+        except Exception as ex:
+            logger.debug('Failed to stat %s. Exception=%s', trace_path, ex)
+            return None
+        if stat.version is None:
+            return None
+        return '|'.join((trace_path, str(stat.length), stat.version, __version__, str(CACHE_FORMAT_VERSION)) + extra)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entry_path(key)
+        try:
+            with open(entry, 'rb') as f:
+                stored_key, value = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except Exception as ex:
+            logger.warning('Failed to read profile cache entry %s. Exception=%s', entry, ex)
+            self._remove(entry)
+            return None
+
+        if stored_key != key:
+            return None
+        try:
+            # the modification time is the recency of the LRU eviction
+            os.utime(entry)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value: Any):
+        data = zlib.compress(pickle.dumps((key, value), protocol=pickle.HIGHEST_PROTOCOL))
+        if len(data) > self.max_bytes:
+            logger.info('Skip caching the profile of %d bytes which exceeds the cache size', len(data))
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # write to a temporary file first, so concurrent readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, self._entry_path(key))
+        except BaseException:
+            self._remove(temp_path)
+            raise
+        self._evict()
+
+    def _entry_path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest + _ENTRY_SUFFIX)
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(_ENTRY_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another process
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            logger.debug('Evict profile cache entry %s', path)
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -3,6 +3,27 @@
 # -------------------------------------------------------------------------
 
 # pyre-unsafe
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+# GPU architecture -> substrings of the names of the kernels which use Tensor Cores.
+# TORCH_PROFILER_TC_ARCHS=default,hopper limits the detection to these sets, all of them are used by default.
+TC_KERNEL_PATTERNS: Dict[str, List[str]] = {
+    # Volta to Ampere kernels.
+    # Refer to https://github.com/NVIDIA/PyProf/blob/fd1b2902e3306119eee40ba6b6e8b2f816920c29/pyprof/prof/tc.py#L19
+    'default': ['h884', 's884', 'h1688', 's1688', 'hmma', 'i8816', '16816',
+                'dgrad_1x1_stride_2x2', 'first_layer_wgrad_kernel', 'conv1x1',
+                'conv2d_c1_k1', 'direct_group', 'xmma_implicit_gemm',
+                'xmma_sparse_conv', 'xmma_warp_specialized_implicit_gemm',
+                'xmma_gemm', 'xmma_sparse_gemm', 'c1688'],
+    # cuBLAS/cuDNN sm90 kernels and CUTLASS 3 warpgroup (wgmma) kernels
+    'hopper': ['sm90_xmma', 'sm90_gemm', 'cutlass3x_sm90', 'gmma'],
+}
+_MEMO_SIZE = 1 << 16
+
+
 class TC_Allowlist_Meta(type):
     # Enable grammar sugar as 'v in TC_Allowlist'.
     def __contains__(cls, item):
@@ -10,43 +31,70 @@ class TC_Allowlist_Meta(type):
 
 
 class TC_Allowlist(metaclass=TC_Allowlist_Meta):
-    # Refer to https://github.com/NVIDIA/PyProf/blob/fd1b2902e3306119eee40ba6b6e8b2f816920c29/pyprof/prof/tc.py#L19
-    allowlist = ['h884', 's884', 'h1688', 's1688', 'hmma', 'i8816', '16816',
-                 'dgrad_1x1_stride_2x2', 'first_layer_wgrad_kernel', 'conv1x1',
-                 'conv2d_c1_k1', 'direct_group', 'xmma_implicit_gemm',
-                 'xmma_sparse_conv', 'xmma_warp_specialized_implicit_gemm',
-                 'xmma_gemm', 'xmma_sparse_gemm', 'c1688']
+    # If kernel name contains substring equal to any one in allowlist, then it uses tensor core.
+    # The patterns are compiled into one regex alternation, and the results are memoized per kernel
+    # name since the same kernels are launched over and over.
+    archs: List[str] = []
+    allowlist: List[str] = []
+    _pattern = None
 
     @classmethod
     def __contains__(cls, item):
-        # If kernel name contains substring equal to any one in allowlist, then it uses tensor core.
-        for pattern in cls.allowlist:
-            if pattern in item:
-                return True
-        return False
+        return _uses_tensor_core(item)
+
+    @classmethod
+    def configure(cls, archs: Iterable[str]):
+        """Detect the Tensor Core kernels of these architectures of TC_KERNEL_PATTERNS."""
+        cls.archs = [arch for arch in archs if arch in TC_KERNEL_PATTERNS]
+        cls.allowlist = [pattern for arch in cls.archs for pattern in TC_KERNEL_PATTERNS[arch]]
+        cls._pattern = re.compile('|'.join(re.escape(p) for p in cls.allowlist)) if cls.allowlist else None
+        _uses_tensor_core.cache_clear()
+
+    @classmethod
+    def register(cls, arch: str, patterns: Iterable[str]):
+        """Add the kernel name patterns of an architecture and enable it."""
+        TC_KERNEL_PATTERNS.setdefault(arch, []).extend(patterns)
+        cls.configure(cls.archs + [arch] if arch not in cls.archs else cls.archs)
+
+
+@lru_cache(maxsize=_MEMO_SIZE)
+def _uses_tensor_core(name: str) -> bool:
+    pattern = TC_Allowlist._pattern
+    return pattern is not None and pattern.search(name) is not None
+
+
+def _configured_archs() -> List[str]:
+    archs = os.environ.get('TORCH_PROFILER_TC_ARCHS')
+    if not archs:
+        return list(TC_KERNEL_PATTERNS)
+    return [arch.strip() for arch in archs.split(',') if arch.strip()]
+
+
+TC_Allowlist.configure(_configured_archs())
 
 
 class TC_OP_Allowlist(metaclass=TC_Allowlist_Meta):
     # Refer to https://github.com/pytorch/pytorch/blob/69b2bf70f9c0e591ce5e566afa59e19618031ead/aten/src/ATen/autocast_mode.cpp#L290-L351 # noqa: E501
-    allowlist = ['aten::_convolution', 'aten::conv1d', 'aten::conv2d', 'aten::conv3d', 'aten::conv_tbc',
-                 'aten::conv_transpose1d', 'aten::conv_transpose2d', 'aten::conv_transpose3d',
-                 'aten::convolution', 'aten::cudnn_convolution', 'aten::cudnn_convolution_transpose',
-                 'aten::prelu', 'aten::addmm', 'aten::addmv', 'aten::addr',
-                 'aten::matmul', 'aten::mm', 'aten::mv',
-                 'aten::linear', 'aten::addbmm', 'aten::baddbmm', 'aten::bmm',
-                 'aten::chain_matmul', 'aten::linalg_multi_dot',
-                 'aten::_thnn_fused_lstm_cell', 'aten::_thnn_fused_gru_cell', 'aten::lstm_cell',
-                 'aten::gru_cell', 'aten::rnn_tanh_cell', 'aten::rnn_relu_cell',
-                 # The backward ops are got by running above ops' backward
-                 # and recording whether it launched kernels.
-                 'CudnnConvolutionBackward', 'BmmBackward0',
-                 'aten::cudnn_convolution_transpose_backward', 'CudnnConvolutionTransposeBackward',
-                 'MmBackward', 'aten::cudnn_convolution_backward_weight', 'aten::addmm_',
-                 'AddmvBackward', 'MvBackward',
-                 'aten::cudnn_convolution_transpose_backward_weight',
-                 'aten::cudnn_convolution_transpose_backward_input',
-                 'AddmmBackward', 'aten::cudnn_convolution_backward_input',
-                 'AddbmmBackward', 'aten::cudnn_convolution_backward']
+    allowlist = frozenset([
+        'aten::_convolution', 'aten::conv1d', 'aten::conv2d', 'aten::conv3d', 'aten::conv_tbc',
+        'aten::conv_transpose1d', 'aten::conv_transpose2d', 'aten::conv_transpose3d',
+        'aten::convolution', 'aten::cudnn_convolution', 'aten::cudnn_convolution_transpose',
+        'aten::prelu', 'aten::addmm', 'aten::addmv', 'aten::addr',
+        'aten::matmul', 'aten::mm', 'aten::mv',
+        'aten::linear', 'aten::addbmm', 'aten::baddbmm', 'aten::bmm',
+        'aten::chain_matmul', 'aten::linalg_multi_dot',
+        'aten::_thnn_fused_lstm_cell', 'aten::_thnn_fused_gru_cell', 'aten::lstm_cell',
+        'aten::gru_cell', 'aten::rnn_tanh_cell', 'aten::rnn_relu_cell',
+        # The backward ops are got by running above ops' backward
+        # and recording whether it launched kernels.
+        'CudnnConvolutionBackward', 'BmmBackward0',
+        'aten::cudnn_convolution_transpose_backward', 'CudnnConvolutionTransposeBackward',
+        'MmBackward', 'aten::cudnn_convolution_backward_weight', 'aten::addmm_',
+        'AddmvBackward', 'MvBackward',
+        'aten::cudnn_convolution_transpose_backward_weight',
+        'aten::cudnn_convolution_transpose_backward_input',
+        'AddmmBackward', 'aten::cudnn_convolution_backward_input',
+        'AddbmmBackward', 'aten::cudnn_convolution_backward'])
 
     @classmethod
     def __contains__(cls, item):
@@ -56,54 +56,68 @@ EventTypeMap = {
 
 
 class BaseEvent:
+    # Events are created by the millions, so the classes use __slots__ and the raw 'args' dict
+    # is not kept once the fields are extracted.
+    __slots__ = ('type', 'name', 'ts', 'pid', 'tid')
+
     def __init__(self, type, data):
         self.type: str = type
         self.name: str = data.get('name')
         self.ts: int = data.get('ts')
         self.pid: int = data.get('pid')
         self.tid: int = data.get('tid')
-        self.args: Dict = data.get('args', {})
 
 
 class DurationEvent(BaseEvent):
+    __slots__ = ('category', 'duration', 'external_id', 'correlation_id')
+
     def __init__(self, type, data):
         super().__init__(type, data)
         self.category: str = data.get('cat', '')
         self.duration: int = data.get('dur')
 
-        extern_id: Optional[int] = self.args.get('external id')
+        args = data.get('args', {})
+        extern_id: Optional[int] = args.get('external id')
         if extern_id is None:
-            extern_id = self.args.get('External id')
+            extern_id = args.get('External id')
         self.external_id = extern_id
-        self.correlation_id: Optional[int] = self.args.get('correlation')
+        self.correlation_id: Optional[int] = args.get('correlation')
 
 
 class KernelEvent(DurationEvent):
+    __slots__ = ('occupancy', 'blocks_per_sm', 'grid', 'block', 'regs_per_thread', 'shared_memory', 'device_id')
+
     def __init__(self, type, data):
         super().__init__(type, data)
-        self.occupancy = self.args.get('est. achieved occupancy %')
-        self.blocks_per_sm = self.args.get('blocks per SM')
-        self.grid = self.args.get('grid')
-        self.block = self.args.get('block')
-        self.regs_per_thread = self.args.get('registers per thread')
-        self.shared_memory = self.args.get('shared memory')
-        self.device_id = self.args.get('device')
+        args = data.get('args', {})
+        self.occupancy = args.get('est. achieved occupancy %')
+        self.blocks_per_sm = args.get('blocks per SM')
+        self.grid = args.get('grid')
+        self.block = args.get('block')
+        self.regs_per_thread = args.get('registers per thread')
+        self.shared_memory = args.get('shared memory')
+        self.device_id = args.get('device')
 
 
 class OperatorEvent(DurationEvent):
+    __slots__ = ('callstack', 'input_type', 'input_shape')
+
     def __init__(self, type, data):
         super().__init__(type, data)
-        self.callstack = self.args.get('Call stack')
-        self.input_type = self.args.get('Input type')
+        args = data.get('args', {})
+        self.callstack = args.get('Call stack')
+        self.input_type = args.get('Input type')
 
-        shape = self.args.get('Input Dims')
+        shape = args.get('Input Dims')
         if shape is None:
             # Setting shape to '[]' other None is to align with autograd result
-            shape = self.args.get('Input dims', [])
+            shape = args.get('Input dims', [])
         self.input_shape = shape
 
 
 class ProfilerStepEvent(OperatorEvent):
+    __slots__ = ('step',)
+
     def __init__(self, data):
         super().__init__(EventTypes.PROFILER_STEP, data)
         # torch.profiler.profile.step will invoke record_function with name like 'ProfilerStep#5'
@@ -111,11 +125,14 @@ class ProfilerStepEvent(OperatorEvent):
 
 
 class MemoryEvent(BaseEvent):
+    __slots__ = ('scope', 'device_id', 'device_type', 'addr', 'bytes', 'total_allocated', 'total_reserved')
+
     def __init__(self, type, data):
         super().__init__(type, data)
+        args = data.get('args', {})
         self.scope: str = data.get('s', '')
-        self.device_id: int = self.args.get('Device Id')
-        dtype = self.args.get('Device Type')
+        self.device_id: int = args.get('Device Id')
+        dtype = args.get('Device Type')
         if dtype is not None:
             try:
                 dtype = DeviceType(dtype)
@@ -123,44 +140,41 @@ class MemoryEvent(BaseEvent):
                 dtype = None
 
         self.device_type: DeviceType = dtype
-
-    @property
-    def addr(self):
-        return self.args.get('Addr')
-
-    @property
-    def bytes(self):
-        return self.args.get('Bytes', 0)
-
-    @property
-    def total_allocated(self):
-        return self.args.get('Total Allocated', float('nan'))
-
-    @property
-    def total_reserved(self):
-        return self.args.get('Total Reserved', float('nan'))
+        self.addr = args.get('Addr')
+        self.bytes = args.get('Bytes', 0)
+        self.total_allocated = args.get('Total Allocated', float('nan'))
+        self.total_reserved = args.get('Total Reserved', float('nan'))
 
 
 class PythonFunctionEvent(DurationEvent):
+    __slots__ = ('python_id', 'python_parent_id')
+
     def __init__(self, type, data):
         super().__init__(type, data)
-        self.python_id: int = self.args.get('Python id')
-        self.python_parent_id: int = self.args.get('Python parent id')
+        args = data.get('args', {})
+        self.python_id: int = args.get('Python id')
+        self.python_parent_id: int = args.get('Python parent id')
 
 
 class ModuleEvent(PythonFunctionEvent):
+    __slots__ = ('module_id',)
+
     def __init__(self, data):
         super().__init__(EventTypes.MODULE, data)
-        self.module_id: int = self.args.get('Python module id')
+        self.module_id: int = data.get('args', {}).get('Python module id')
 
 
 class PLProfileEvent(DurationEvent):
+    __slots__ = ()
+
     def __init__(self, data):
         super().__init__(EventTypes.PL_PROFILE, data)
         self.name = self.name.replace('[pl][profile]', '')
 
 
 class PLModuleEvent(DurationEvent):
+    __slots__ = ('module_id', 'module_type')
+
     def __init__(self, data):
         super().__init__(EventTypes.PL_MODULE, data)
         self.module_id = 0  # just to be compatible with ModuleEvent processing
@@ -0,0 +1,168 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+import codecs
+import json
+import re
+import zlib
+from json.decoder import JSONDecodeError
+from typing import Any, Dict, Iterator
+
+from .. import io
+
+__all__ = ['TraceStreamReader']
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DEFAULT_CHUNK_SIZE = 1024 * 1024
+# no single event or metadata value is anywhere near this long, a value still undecodable at this size is malformed
+_DEFAULT_MAX_VALUE_SIZE = 64 * 1024 * 1024
+
+
+class TraceStreamReader:
+    """Decode a chrome trace file incrementally.
+
+    The file is read, decompressed and utf-8 decoded chunk by chunk. Top level keys other than
+    'traceEvents' are decoded as a whole into `metadata`, while the 'traceEvents' array is yielded
+    one event dict at a time, so the caller can convert and drop every raw event immediately.
+    A value which cannot be decoded within max_value_size characters raises JSONDecodeError, rather
+    than buffering the rest of the file.
+    """
+
+    def __init__(self, path: str, chunk_size: int = _DEFAULT_CHUNK_SIZE,
+                 max_value_size: int = _DEFAULT_MAX_VALUE_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.max_value_size = max_value_size
+        self.metadata: Dict[str, Any] = {}
+
+        # Kineto may export json file with control characters, so decode it non-strictly.
+        self._decoder = json.JSONDecoder(strict=False)
+        self._chunks = None
+        self._decompressor = None
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def open(self) -> Dict[str, Any]:
+        """Decode the file up to the 'traceEvents' array.
+
+        Returns a dict of the metadata found so far with 'traceEvents' bound to a lazy event iterator.
+        Metadata stored after the events is added to `metadata` once the iterator is exhausted.
+        """
+        if not io.exists(self.path):
+            raise FileNotFoundError(self.path)
+
+        self._chunks = self._read_chunks()
+        self._expect('{')
+        if self._peek() == '}':
+            return dict(self.metadata)
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'traceEvents':
+                return dict(self.metadata, traceEvents=self._iter_events())
+            self.metadata[key] = self._value()
+            if self._next_char() == '}':
+                return dict(self.metadata)
+
+    def _iter_events(self) -> Iterator[Dict[str, Any]]:
+        self._expect('[')
+        if self._peek() == ']':
+            self._next_char()
+        else:
+            while True:
+                yield self._value()
+                if self._next_char() == ']':
+                    break
+
+        # the remaining top level keys, e.g. 'traceName' or 'displayTimeUnit'
+        while self._next_char() == ',':
+            key = self._value()
+            self._expect(':')
+            self.metadata[key] = self._value()
+        self._buf = ''
+        self._chunks = None
+
+    def _read_chunks(self) -> Iterator[str]:
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        if self.path.endswith('.gz'):
+            self._decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        with io.File(self.path, 'rb') as f:
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                if self._decompressor is not None:
+                    data = self._decompress(data)
+                yield text_decoder.decode(data)
+        if self._decompressor is not None:
+            yield text_decoder.decode(self._decompressor.flush())
+        yield text_decoder.decode(b'', final=True)
+
+    def _decompress(self, data: bytes) -> bytes:
+        # gzip files may consist of several members, each of them needs a fresh decompressor.
+        out = [self._decompressor.decompress(data)]
+        while self._decompressor.eof and self._decompressor.unused_data:
+            data = self._decompressor.unused_data
+            self._decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            out.append(self._decompressor.decompress(data))
+        return b''.join(out)
+
+    def _fill(self, size: int):
+        """Append at least `size` characters to the buffer unless the end of file is reached."""
+        pending = [self._buf[self._pos:]]
+        read = 0
+        while read < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._eof = True
+                break
+            pending.append(chunk)
+            read += len(chunk)
+        self._buf = ''.join(pending)
+        self._pos = 0
+
+    def _skip_whitespace(self):
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or self._eof:
+                return
+            self._fill(self.chunk_size)
+
+    def _peek(self) -> str:
+        self._skip_whitespace()
+        return self._buf[self._pos:self._pos + 1]
+
+    def _next_char(self) -> str:
+        c = self._peek()
+        if not c:
+            raise JSONDecodeError('Unexpected end of file', self._buf, self._pos)
+        self._pos += 1
+        return c
+
+    def _expect(self, expected: str):
+        c = self._next_char()
+        if c != expected:
+            raise JSONDecodeError("Expecting '%s'" % expected, self._buf, self._pos - 1)
+
+    def _value(self) -> Any:
+        self._skip_whitespace()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+            except JSONDecodeError:
+                # a malformed token, e.g. an unquoted N/A, fails the same way as a value cut by the chunk
+                # boundary; only the bounded size tells them apart
+                if self._eof or len(self._buf) - self._pos > self.max_value_size:
+                    raise
+                # the value is cut by the chunk boundary, grow the buffer geometrically
+                self._fill(max(self.chunk_size, len(self._buf) - self._pos))
+                continue
+            if end == len(self._buf) and not self._eof:
+                # a number at the end of the buffer may continue in the next chunk
+                self._fill(self.chunk_size)
+                continue
+            self._pos = end
+            return obj
@@ -0,0 +1,384 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+import math
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .node import (BackwardNode, DataLoaderNode, ModuleNode, OperatorNode, OptimizerNode, PLModuleNode,
+                   PLProfileNode, ProfilerStepNode, is_operator_node)
+
+__all__ = ['TreeStore', 'OperatorNodeView', 'RuntimeNodeView', 'DeviceNodeView']
+
+NODE_CLASSES = (OperatorNode, ProfilerStepNode, ModuleNode, BackwardNode, PLProfileNode, PLModuleNode,
+                DataLoaderNode, OptimizerNode)
+_NODE_CLASS_CODES = {cls: i for i, cls in enumerate(NODE_CLASSES)}
+
+# sentinel of the index arrays for the missing parent/child/sibling.
+NO_NODE = -1
+
+# fields of each table: numbers, interned values (strings and lists) and booleans
+_OP_FIELDS = (
+    ('start_time', 'end_time', 'tid', 'external_id', 'device_duration', 'self_host_duration',
+     'self_device_duration', 'tc_self_duration', 'tc_total_duration'),
+    ('name', 'type', 'input_shape', 'input_type', 'callstack'),
+    ('tc_eligible',),
+)
+_RUNTIME_FIELDS = (
+    ('start_time', 'end_time', 'tid', 'external_id', 'device_duration', 'tc_duration'),
+    ('name', 'type'),
+    (),
+)
+_DEVICE_FIELDS = (
+    ('start_time', 'end_time', 'tid', 'external_id', 'blocks_per_sm', 'occupancy', 'regs_per_thread',
+     'shared_memory', 'device_id'),
+    ('name', 'type', 'op_name', 'grid', 'block'),
+    ('op_tc_eligible', 'tc_used'),
+)
+
+_FLOAT, _INT, _NONE = 0, 1, 2
+_INT64_MIN, _INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+_FLOAT_EXACT = 1 << 53
+
+
+class _Interner:
+    """Intern the strings and the lists (shapes, grids, ...) into ids of one lookup list."""
+
+    def __init__(self):
+        self.ids: Dict = {}
+        self.values: List = []
+
+    def __call__(self, value) -> int:
+        key = _hashable(value)
+        i = self.ids.get(key)
+        if i is None:
+            i = self.ids[key] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class _NumberColumn:
+    """A column of numbers, in the narrowest int array when they are all ints (or None) and float64 otherwise.
+
+    The python values are restored exactly: kinds records which rows were None (or ints in a float column),
+    and the values which don't fit the array (e.g. ints out of the int64 range) are kept aside.
+    """
+
+    def __init__(self, values: List):
+        self.kinds: Optional[np.ndarray] = None
+        self.others: Dict[int, Any] = {}
+        kinds = np.zeros(len(values), dtype=np.uint8)
+        data = []
+        if all(type(v) is int or v is None for v in values):
+            for i, v in enumerate(values):
+                if v is None:
+                    kinds[i] = _NONE
+                    data.append(0)
+                elif _INT64_MIN <= v <= _INT64_MAX:
+                    data.append(v)
+                else:
+                    self.others[i] = v
+                    data.append(0)
+            self.data = _narrow(np.array(data, dtype=np.int64))
+        else:
+            for i, v in enumerate(values):
+                t = type(v)
+                if t is float:
+                    data.append(v)
+                elif t is int and -_FLOAT_EXACT <= v <= _FLOAT_EXACT:
+                    kinds[i] = _INT
+                    data.append(v)
+                elif v is None:
+                    kinds[i] = _NONE
+                    data.append(math.nan)
+                else:
+                    self.others[i] = v
+                    data.append(math.nan)
+            self.data = np.array(data, dtype=np.float64)
+        if kinds.any():
+            self.kinds = kinds
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.kinds.nbytes if self.kinds is not None else 0)
+
+    def __getitem__(self, row: int):
+        value = self.others.get(row)
+        if value is not None:
+            return value
+        if self.kinds is not None:
+            kind = self.kinds[row]
+            if kind == _NONE:
+                return None
+            if kind == _INT:
+                return int(self.data[row])
+        return self.data[row].item()
+
+    def tolist(self) -> List:
+        values = self.data.tolist()
+        if self.kinds is not None:
+            for row in np.flatnonzero(self.kinds == _INT).tolist():
+                values[row] = int(values[row])
+            for row in np.flatnonzero(self.kinds == _NONE).tolist():
+                values[row] = None
+        for row, value in self.others.items():
+            values[row] = value
+        return values
+
+
+class _Table:
+    """The columns of one kind of node, in the row order of the store."""
+
+    def __init__(self, rows: List, fields, intern: _Interner):
+        numbers, values, flags = fields
+        self.numbers = {f: _NumberColumn([getattr(r, f) for r in rows]) for f in numbers}
+        self.values = {f: _narrow(np.array([intern(getattr(r, f)) for r in rows], dtype=np.int64)) for f in values}
+        self.flags = {f: np.array([bool(getattr(r, f)) for r in rows], dtype=bool) for f in flags}
+
+    @property
+    def nbytes(self) -> int:
+        return (sum(c.nbytes for c in self.numbers.values()) + sum(c.nbytes for c in self.values.values())
+                + sum(c.nbytes for c in self.flags.values()))
+
+    def get(self, field: str, row: int, values: List):
+        if field in self.numbers:
+            return self.numbers[field][row]
+        if field in self.values:
+            return values[self.values[field][row]]
+        return bool(self.flags[field][row])
+
+    def columns(self, values: List) -> Dict[str, List]:
+        """All the columns decoded to python lists."""
+        columns = {f: c.tolist() for f, c in self.numbers.items()}
+        columns.update({f: [values[i] for i in c.tolist()] for f, c in self.values.items()})
+        columns.update({f: c.tolist() for f, c in self.flags.items()})
+        return columns
+
+
+class TreeStore:
+    """Compact array-backed representation of an operator tree.
+
+    The operators are laid out in pre-order, linked by parent/first-child/next-sibling index arrays.
+    Their times, durations and Tensor Core flags are NumPy columns, and the names, shapes and callstacks
+    are interned into one lookup list. The runtimes of each operator and the device nodes of each runtime
+    are rows of two more tables, indexed in CSR style by offset arrays. OperatorNodeView and friends
+    expose a row with the attributes of the node objects, and to_dict serializes like OperatorNode.to_dict.
+    """
+
+    def __init__(self, root: OperatorNode):
+        """Pack the tree under root, with the statistics already filled into the nodes."""
+        ops: List[OperatorNode] = []
+        parent: List[int] = []
+        stack = [(root, NO_NODE)]
+        while stack:
+            node, p = stack.pop()
+            parent.append(p)
+            ops.append(node)
+            # a subtree reachable twice (from two backward modules) is stored twice, just like to_dict does
+            stack.extend((child, len(ops) - 1) for child in reversed(node.children))
+
+        first_child = [NO_NODE] * len(ops)
+        next_sibling = [NO_NODE] * len(ops)
+        last_child = [NO_NODE] * len(ops)
+        for i, p in enumerate(parent):
+            if p == NO_NODE:
+                continue
+            if first_child[p] == NO_NODE:
+                first_child[p] = i
+            else:
+                next_sibling[last_child[p]] = i
+            last_child[p] = i
+
+        runtimes = [rt for op in ops for rt in op.runtimes]
+        devices = [d for rt in runtimes for d in (rt.device_nodes or [])]
+
+        self.parent = np.array(parent, dtype=np.int32)
+        self.first_child = np.array(first_child, dtype=np.int32)
+        self.next_sibling = np.array(next_sibling, dtype=np.int32)
+        self.node_class = np.array([_NODE_CLASS_CODES.get(type(op), 0) for op in ops], dtype=np.int8)
+        self.is_operator = np.array([is_operator_node(op) for op in ops], dtype=bool)
+        # rows runtime_offsets[i]:runtime_offsets[i + 1] are the runtimes of operator i, likewise for the devices
+        self.runtime_offsets = _narrow(np.cumsum([0] + [len(op.runtimes) for op in ops], dtype=np.int64))
+        self.device_offsets = _narrow(np.cumsum([0] + [len(rt.device_nodes or []) for rt in runtimes], dtype=np.int64))
+
+        intern = _Interner()
+        self.ops = _Table(ops, _OP_FIELDS, intern)
+        self.runtimes = _Table(runtimes, _RUNTIME_FIELDS, intern)
+        self.devices = _Table(devices, _DEVICE_FIELDS, intern)
+        self.values = intern.values
+
+    def __len__(self):
+        return len(self.parent)
+
+    @property
+    def root(self) -> 'OperatorNodeView':
+        return OperatorNodeView(self, 0)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the arrays. The interned values are shared by all the rows, so they are not counted."""
+        arrays = (self.parent, self.first_child, self.next_sibling, self.node_class, self.is_operator,
+                  self.runtime_offsets, self.device_offsets)
+        return sum(a.nbytes for a in arrays) + self.ops.nbytes + self.runtimes.nbytes + self.devices.nbytes
+
+    def children(self, index: int) -> List[int]:
+        children = []
+        child = self.first_child[index]
+        while child != NO_NODE:
+            children.append(int(child))
+            child = self.next_sibling[child]
+        return children
+
+    def subtree(self, index: int) -> List[int]:
+        """Indexes of the subtree of index in pre-order."""
+        nodes = []
+        stack = [index]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(reversed(self.children(node)))
+        return nodes
+
+    def to_dict(self, index: int = 0) -> Dict[str, Any]:
+        """The same dictionary as OperatorNode.to_dict of the node at index, built without recursion."""
+        op_columns = self.ops.columns(self.values)
+        rt_columns = self.runtimes.columns(self.values)
+        device_columns = self.devices.columns(self.values)
+
+        def runtime_dict(row):
+            device_start, device_end = self.device_offsets[row], self.device_offsets[row + 1]
+            result = _base_dict(rt_columns, row)
+            result['device_duration'] = rt_columns['device_duration'][row]
+            result.update({
+                'device_nodes': [device_dict(d) for d in range(device_start, device_end)] or None,
+                'tc_duration': rt_columns['tc_duration'][row]
+            })
+            return result
+
+        def device_dict(row):
+            result = _base_dict(device_columns, row)
+            result.update({f: device_columns[f][row] for f in (
+                'op_tc_eligible', 'op_name', 'blocks_per_sm', 'occupancy', 'grid', 'block', 'regs_per_thread',
+                'shared_memory', 'tc_used', 'device_id')})
+            return result
+
+        dicts: Dict[int, Dict[str, Any]] = {}
+        for i in reversed(self.subtree(index)):
+            result = _base_dict(op_columns, i)
+            result['device_duration'] = op_columns['device_duration'][i]
+            result.update({
+                'children': [dicts.pop(child) for child in self.children(i)],
+                'runtimes': [runtime_dict(r) for r in range(self.runtime_offsets[i], self.runtime_offsets[i + 1])],
+                'input_shape': op_columns['input_shape'][i],
+                'input_type': op_columns['input_type'][i],
+                'callstack': op_columns['callstack'][i],
+                'self_host_duration': op_columns['self_host_duration'][i],
+                'self_device_duration': op_columns['self_device_duration'][i],
+                'tc_eligible': op_columns['tc_eligible'][i],
+                'tc_self_duration': op_columns['tc_self_duration'][i],
+                'tc_total_duration': op_columns['tc_total_duration'][i],
+                'device_duration': op_columns['device_duration'][i]
+            })
+            dicts[i] = result
+        return dicts[index]
+
+
+class _NodeView:
+    """A row of one table of a TreeStore, read through the attributes of the node objects."""
+    __slots__ = ('store', 'index')
+    _table = None
+
+    def __init__(self, store: TreeStore, index: int):
+        self.store = store
+        self.index = index
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        try:
+            return getattr(self.store, self._table).get(name, self.index, self.store.values)
+        except KeyError:
+            raise AttributeError(name)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other.store is self.store and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+    @property
+    def duration(self):
+        start_time, end_time = self.start_time, self.end_time
+        if start_time is not None and end_time is not None:
+            return end_time - start_time
+        return 0
+
+
+class OperatorNodeView(_NodeView):
+    __slots__ = ()
+    _table = 'ops'
+
+    @property
+    def node_class(self) -> type:
+        return NODE_CLASSES[self.store.node_class[self.index]]
+
+    @property
+    def children(self) -> List['OperatorNodeView']:
+        return [OperatorNodeView(self.store, i) for i in self.store.children(self.index)]
+
+    @property
+    def runtimes(self) -> List['RuntimeNodeView']:
+        offsets = self.store.runtime_offsets
+        return [RuntimeNodeView(self.store, r) for r in range(offsets[self.index], offsets[self.index + 1])]
+
+    def to_dict(self):
+        return self.store.to_dict(self.index)
+
+
+class RuntimeNodeView(_NodeView):
+    __slots__ = ()
+    _table = 'runtimes'
+
+    @property
+    def device_nodes(self) -> Optional[List['DeviceNodeView']]:
+        offsets = self.store.device_offsets
+        return [DeviceNodeView(self.store, d) for d in range(offsets[self.index], offsets[self.index + 1])] or None
+
+
+class DeviceNodeView(_NodeView):
+    __slots__ = ()
+    _table = 'devices'
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return type(value), value
+
+
+def _narrow(data: np.ndarray) -> np.ndarray:
+    """The int array in the smallest int dtype holding its values."""
+    if data.dtype.kind != 'i' or not len(data):
+        return data
+    low, high = data.min(), data.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return data.astype(dtype)
+    return data
+
+
+def _base_dict(columns: Dict[str, List], row: int) -> Dict[str, Any]:
+    start_time, end_time = columns['start_time'][row], columns['end_time'][row]
+    return {
+        'name': columns['name'][row],
+        'start_time': start_time,
+        'end_time': end_time,
+        'type': columns['type'][row],
+        'tid': columns['tid'][row],
+        'external_id': columns['external_id'][row],
+        'duration': end_time - start_time if start_time is not None and end_time is not None else 0
+    }
@@ -0,0 +1,209 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+"""Memory-bounded residency of the per-run data of the plugin (operator trees and serialized views)."""
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import utils
+
+__all__ = ['ResidencyManager', 'estimate_size']
+
+logger = utils.get_logger()
+
+
+def estimate_size(obj: Any) -> int:
+    """Approximate bytes held by a tree of dicts, lists, tuples and scalars. Objects shared in the tree,
+    like the repeated broadcast nodes, are counted once."""
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple)):
+            stack.extend(o)
+    return total
+
+
+class ResidencyManager:
+    """LRU of the per-run values kept in memory within max_bytes.
+
+    The least recently used runs beyond the budget are pickled to spill_dir and read back on the next
+    get(). The value of the run being put or got is never evicted by that call, so a run larger than the
+    budget still works, it is just the only one resident. Evictions are bookkept under the lock and
+    written by spill_pending(), which the callers run outside of their own locks; until then the values
+    are served from memory.
+    """
+
+    def __init__(self, spill_dir: str, max_bytes: Optional[int] = None):
+        self.spill_dir = spill_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # one writer at a time, so a value is never written twice concurrently
+        self._spill_lock = threading.Lock()
+        # name -> (value, estimated bytes), least recently used first
+        self._resident: 'OrderedDict[str, Tuple[Any, int]]' = OrderedDict()
+        self._resident_bytes = 0
+        # evicted but not written yet: name -> (value, estimated bytes)
+        self._pending: Dict[str, Tuple[Any, int]] = {}
+        # name -> (spill file, estimated bytes)
+        self._spilled: Dict[str, Tuple[str, int]] = {}
+
+    @staticmethod
+    def from_env(spill_dir: str) -> 'ResidencyManager':
+        """TORCH_PROFILER_RESIDENT_MAX_BYTES bounds the memory of the loaded runs, unbounded by default."""
+        max_bytes = os.environ.get('TORCH_PROFILER_RESIDENT_MAX_BYTES')
+        return ResidencyManager(spill_dir, int(max_bytes) if max_bytes else None)
+
+    def put(self, name: str, value: Any, nbytes: int):
+        """Make value the resident value of the run, replacing any previous one."""
+        with self._lock:
+            self._discard(name)
+            self._admit(name, value, nbytes)
+
+    def get(self, name: str, admit: bool = True) -> Optional[Any]:
+        """The value of the run, read back from disk if it was evicted. A value read back is only made
+        resident again when admit, so one pass over all the runs does not flush the recently used ones."""
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry is not None:
+                self._resident.move_to_end(name)
+                return entry[0]
+            entry = self._pending.get(name)
+            if entry is not None and admit:
+                del self._pending[name]
+                self._admit(name, *entry)
+            spilled = self._spilled.get(name)
+        if entry is not None:
+            self.spill_pending()
+            return entry[0]
+        if spilled is None:
+            return None
+
+        path, nbytes = spilled
+        logger.debug('Read back the data of run %s from %s', name, path)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except Exception as ex:
+            with self._lock:
+                replaced = self._spilled.get(name) is not spilled
+                if not replaced:
+                    # removed or corrupted on disk, e.g. by a tmp cleaner: the data of the run is lost
+                    del self._spilled[name]
+                    self._remove_file(path)
+            if replaced:
+                # read back or replaced by another thread meanwhile
+                return self.get(name, admit)
+            logger.warning('Failed to read back the data of run %s from %s. Exception=%s', name, path, ex)
+            return None
+        if admit:
+            with self._lock:
+                # unless it was replaced meanwhile
+                if self._spilled.get(name) == spilled:
+                    del self._spilled[name]
+                    self._remove_file(path)
+                    self._admit(name, value, nbytes)
+            self.spill_pending()
+        return value
+
+    def remove(self, name: str):
+        with self._lock:
+            self._discard(name)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._resident) + list(self._pending) + list(self._spilled)
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return self._resident_bytes
+
+    def spill_pending(self):
+        """Write the evicted values to disk."""
+        with self._spill_lock:
+            self._spill_pending()
+
+    def _spill_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                name, entry = next(iter(self._pending.items()))
+            value, nbytes = entry
+            path = self._spill_path(name)
+            try:
+                self._write(path, value)
+            except Exception as ex:
+                logger.warning('Failed to spill the data of run %s, keep it in memory. Exception=%s', name, ex)
+                with self._lock:
+                    if self._pending.get(name) is entry:
+                        del self._pending[name]
+                        self._resident[name] = entry
+                        self._resident.move_to_end(name, last=False)
+                        self._resident_bytes += nbytes
+                return
+            with self._lock:
+                if self._pending.get(name) is entry:
+                    del self._pending[name]
+                    self._spilled[name] = (path, nbytes)
+                    logger.info('Evicted run %s (%d bytes) to %s', name, nbytes, path)
+                else:
+                    # put or got back meanwhile
+                    self._remove_file(path)
+
+    def _admit(self, name: str, value: Any, nbytes: int):
+        self._resident[name] = (value, nbytes)
+        self._resident_bytes += nbytes
+        if self.max_bytes is None:
+            return
+        while self._resident_bytes > self.max_bytes and len(self._resident) > 1:
+            victim, entry = next(iter(self._resident.items()))
+            if victim == name:
+                break
+            del self._resident[victim]
+            self._resident_bytes -= entry[1]
+            self._pending[victim] = entry
+
+    def _discard(self, name: str):
+        entry = self._resident.pop(name, None)
+        if entry is not None:
+            self._resident_bytes -= entry[1]
+        self._pending.pop(name, None)
+        spilled = self._spilled.pop(name, None)
+        if spilled is not None:
+            self._remove_file(spilled[0])
+
+    def _spill_path(self, name: str) -> str:
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, 'run-{}.pkl'.format(digest))
+
+    @staticmethod
+    def _write(path: str, value: Any):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
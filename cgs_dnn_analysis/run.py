@@ -1,9 +1,11 @@
 # cgs_dnn_analysis/run.py
 import logging
 from typing import Any, Dict, List, Optional
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
 import re
 
+from .matchers import DEFAULT_MATCHER, OperationMatcher
+
 # Set up logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -11,6 +13,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_STEP_PATTERN = re.compile(r'ProfilerStep#(\d+)')
+
 
 class OperatorNode:
     def __init__(self,
@@ -39,34 +43,38 @@ class OperatorNode:
 
 
 class StepDataCollector:
-    def __init__(self):
+    def __init__(self, matcher: Optional[OperationMatcher] = None):
         self.steps_data: Dict[int, Dict[str, Any]] = defaultdict(dict)
+        # classifies the operator names into the operation kinds, see matchers.py
+        self.matcher = matcher or DEFAULT_MATCHER
 
     def extract_step_number(self, name: str) -> Optional[int]:
-        m = re.search(r'ProfilerStep#(\d+)', name)
+        m = _STEP_PATTERN.search(name)
         return int(m.group(1)) if m else None
 
     def is_operation(self, name: str, op_type: str) -> bool:
-        ops = {
-            'forward': 'nn.Module: DistributedDataParallel_0',
-            'loss': 'aten::cross_entropy_loss',
-            'backward': 'nn.Module: DistributedDataParallel_0.backward',
-            'optimizer': 'Optimizer.step#SGD.step',
-            'broadcast': 'nccl:broadcast',
-            'allreduce': 'nccl:all_reduce',
-        }
-        return name == ops.get(op_type, '')
+        return self.matcher.kind(name) == op_type
 
     def find_operation(self, node: Dict[str, Any], op_type: str) -> Optional[Dict[str, Any]]:
         if not node:
             return None
-        if self.is_operation(node.get('name', ''), op_type):
-            return node
-        for c in node.get('children', []):
-            res = self.find_operation(c, op_type)
-            if res:
-                return res
-        return None
+        return self.find_operations(node, (op_type,)).get(op_type)
+
+    def find_operations(self, node: Dict[str, Any], op_types) -> Dict[str, Dict[str, Any]]:
+        """The first node in pre-order of each of op_types, all found in a single traversal
+        which stops as soon as every kind is matched."""
+        found: Dict[str, Dict[str, Any]] = {}
+        kind_of = self.matcher.kind
+        stack = [node]
+        while stack and len(found) < len(op_types):
+            n = stack.pop()
+            kind = kind_of(n.get('name', ''))
+            if kind is not None and kind in op_types and kind not in found:
+                found[kind] = n
+            children = n.get('children')
+            if children:
+                stack.extend(reversed(children))
+        return found
 
     def process_main_thread(self, tree: Dict[str, Any]):
         for c in tree.get('children', []):
@@ -76,12 +84,11 @@ class StepDataCollector:
             if step is None:
                 continue
             logger.debug(f"[Main] step {step}")
-            fwd = self.find_operation(c, 'forward')
-            if fwd:
-                self.steps_data[step]['forward'] = fwd
-            loss = self.find_operation(c, 'loss')
-            if loss:
-                self.steps_data[step]['loss'] = loss
+            found = self.find_operations(c, ('forward', 'loss'))
+            if 'forward' in found:
+                self.steps_data[step]['forward'] = found['forward']
+            if 'loss' in found:
+                self.steps_data[step]['loss'] = found['loss']
 
     def process_backward_and_optimizer(self, tree: Dict[str, Any]):
         step = None
@@ -96,33 +103,49 @@ class StepDataCollector:
                 self.steps_data[step]['optimizer'] = c
 
     def process_communication(self, tree: Dict[str, Any]):
+        # indexes of the step trees, built once instead of searching the trees for every collective
+        forward_ids = {step: self.count_external_ids(data['forward'])
+                       for step, data in self.steps_data.items() if data.get('forward')}
+        backward_all_reduces = {step: self.index_all_reduces(data['backward'], self.matcher)
+                                for step, data in self.steps_data.items() if data.get('backward')}
+
         for c in tree.get('children', []):
-            name = c.get('name', '')
+            kind = self.matcher.kind(c.get('name', ''))
             ext = c.get('external_id')
-            if name == 'nccl:broadcast':
-                for step, data in self.steps_data.items():
-                    fwd = data.get('forward')
-                    if not fwd:
-                        continue
-                    queue = [fwd]
-                    while queue:
-                        curr = queue.pop(0)
-                        if curr.get('external_id') == ext:
-                            data.setdefault('broadcasts', []).append(c)
-                        queue.extend(curr.get('children', []))
-            elif name == 'nccl:all_reduce':
-                for data in self.steps_data.values():
-                    bwd = data.get('backward')
-                    if not bwd:
-                        continue
-                    queue = [bwd]
-                    updated = False
-                    while queue and not updated:
-                        curr = queue.pop(0)
-                        if curr.get('external_id') == ext and curr.get('name') == 'nccl:all_reduce':
-                            curr.update(c)
-                            updated = True
-                        queue.extend(curr.get('children', []))
+            if kind == 'broadcast':
+                for step, counts in forward_ids.items():
+                    # every forward node with the external id adds the broadcast once
+                    count = counts.get(ext)
+                    if count:
+                        self.steps_data[step].setdefault('broadcasts', []).extend([c] * count)
+            elif kind == 'allreduce':
+                for all_reduces in backward_all_reduces.values():
+                    node = all_reduces.get(ext)
+                    if node is not None:
+                        node.update(c)
+
+    @staticmethod
+    def count_external_ids(root: Dict[str, Any]) -> Counter:
+        """external_id -> the number of nodes with it in the tree."""
+        counts = Counter()
+        stack = [root]
+        while stack:
+            n = stack.pop()
+            counts[n.get('external_id')] += 1
+            stack.extend(n.get('children', []))
+        return counts
+
+    @staticmethod
+    def index_all_reduces(root: Dict[str, Any], matcher: OperationMatcher) -> Dict[Any, Dict[str, Any]]:
+        """external_id -> the first allreduce node with it in breadth-first order."""
+        index: Dict[Any, Dict[str, Any]] = {}
+        queue = deque([root])
+        while queue:
+            n = queue.popleft()
+            if matcher.kind(n.get('name')) == 'allreduce':
+                index.setdefault(n.get('external_id'), n)
+            queue.extend(n.get('children', []))
+        return index
 
 
 def prepare_backward_data(bwd: Any) -> Any:
@@ -135,11 +158,12 @@ def prepare_backward_data(bwd: Any) -> Any:
     return second if second else bwd
 
 
-def filter_backward_data(layers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def filter_backward_data(layers: List[Dict[str, Any]],
+                         matcher: OperationMatcher = DEFAULT_MATCHER) -> List[Dict[str, Any]]:
     def find_all(n: Dict[str, Any]) -> List[Dict[str, Any]]:
         out = []
         for c in n.get('children', []):
-            if c.get('name') == 'nccl:all_reduce':
+            if matcher.kind(c.get('name')) == 'allreduce':
                 out.append(c)
             out.extend(find_all(c))
         return out
@@ -158,13 +182,24 @@ def prepare_forward_and_loss_data(step: Dict[str, Any]):
             return None
         return name.rsplit('.backward', 1)[0]
 
-    def find_forward_by_name(root: Dict[str, Any], target: str) -> Optional[Dict[str, Any]]:
-        if root.get('name', '').endswith(target):
-            return root
-        for c in root.get('children', []):
-            res = find_forward_by_name(c, target)
-            if res:
-                return res
+    def first_nodes_by_name(root: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """name -> the first node of that name in pre-order, ordered by that first occurrence."""
+        first: Dict[str, Dict[str, Any]] = {}
+        stack = [root]
+        while stack:
+            n = stack.pop()
+            first.setdefault(n.get('name', ''), n)
+            children = n.get('children')
+            if children:
+                stack.extend(reversed(children))
+        return first
+
+    def find_forward_by_name(first_by_name: Dict[str, Dict[str, Any]], target: str) -> Optional[Dict[str, Any]]:
+        # the first node in pre-order whose name ends with target; it is never after the exact match
+        exact = first_by_name.get(target)
+        for name, node in first_by_name.items():
+            if node is exact or name.endswith(target):
+                return node
         return None
 
     if 'forward' in step and 'backward' in step:
@@ -173,13 +208,14 @@ def prepare_forward_and_loss_data(step: Dict[str, Any]):
         fwd_list = fwd if isinstance(fwd, list) else [fwd]
         bwd_list = bwd if isinstance(bwd, list) else [bwd]
 
-        forward_root = fwd_list[0]
+        # one traversal of the forward tree serves the lookups of all the backward modules
+        first_by_name = first_nodes_by_name(fwd_list[0])
         new_fwd = []
         for b in bwd_list:
             cleaned = clean_backward_name(b.get('name', ''))
             if not cleaned:
                 continue
-            match = find_forward_by_name(forward_root, cleaned)
+            match = find_forward_by_name(first_by_name, cleaned)
             if match:
                 node = {
                     'name': match['name'],
@@ -237,10 +273,14 @@ def trim_and_sort_operations(step: Dict[str, Any]):
 
 
 class Run:
-    def __init__(self, name: str, run_dir: str):
+    def __init__(self, name: str, run_dir: str, matcher: Optional[OperationMatcher] = None):
         self.name = name
         self.run_dir = run_dir
+        # the matcher profile the steps of the run were extracted with, the views classify the collectives by it
+        self.matcher = matcher or DEFAULT_MATCHER
         self.profiles: Dict[str, 'RunProfile'] = {}
+        # worker -> Fingerprint of the trace file its profile was parsed from, see RunLoader.load
+        self.fingerprints: Dict[str, Any] = {}
 
     @property
     def workers(self) -> List[str]:
@@ -260,8 +300,19 @@ class RunProfile:
         self.worker = worker
         self.span = span
         self.tid2tree: Dict[int, OperatorNode] = {}
-
-    def get_operator_tree(self) -> Optional[Dict[int, Any]]:
+        # step-level result of get_operator_tree, computed once or restored from the profile cache
+        self.operator_tree: Optional[Dict[int, Any]] = None
+
+    def compact(self) -> 'RunProfile':
+        """Copy of the profile holding only the step-level result, without the operator trees.
+        It is what the parse process sends back, so the parent never unpickles the full trees."""
+        profile = RunProfile(self.worker, self.span)
+        profile.operator_tree = self.get_operator_tree()
+        return profile
+
+    def get_operator_tree(self, matcher: Optional[OperationMatcher] = None) -> Optional[Dict[int, Any]]:
+        if self.operator_tree is not None:
+            return self.operator_tree
         if not self.tid2tree:
             logger.warning(f"tid2tree is empty for {self.worker}")
             return None
@@ -270,7 +321,7 @@ class RunProfile:
             [(tid, node.to_dict()) for tid, node in self.tid2tree.items()],
             key=lambda x: x[1].get('start_time', 0)
         )
-        collector = StepDataCollector()
+        collector = StepDataCollector(matcher)
         first_main, in_bwd, in_comm = True, False, False
 
         for tid, tree in items:
@@ -289,7 +340,7 @@ class RunProfile:
 
         for sd in collector.steps_data.values():
             if 'backward' in sd:
-                sd['backward'] = filter_backward_data(prepare_backward_data(sd['backward']))
+                sd['backward'] = filter_backward_data(prepare_backward_data(sd['backward']), collector.matcher)
             prepare_forward_and_loss_data(sd)
             trim_and_sort_operations(sd)
         result: Dict[int, Dict[str, Any]] = {}
@@ -302,4 +353,5 @@ class RunProfile:
                     ordered[key] = sd[key]
             result[step_num] = ordered
 
+        self.operator_tree = result
         return result
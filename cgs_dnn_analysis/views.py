@@ -0,0 +1,334 @@
+# -------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# --------------------------------------------------------------------------
+
+# pyre-unsafe
+"""View models of the /runtime, /dag and /all_operator_trees routes, built from the step data of get_operator_tree."""
+import copy
+import re
+from typing import Any, Callable, Dict, FrozenSet, List
+
+from .matchers import DEFAULT_MATCHER, OperationMatcher
+
+__all__ = ['runtime_step_view', 'dag_step_view', 'projected_step_view']
+
+_MODULE_PREFIX = re.compile(r'\bnn\.Module\s*:\s*')
+_NAMESPACE_PREFIX = re.compile(r'^(?:aten|autograd|torch)::')
+_SEQUENTIAL = re.compile(r'^Sequential_(\d+)')
+# the runtime view has always used this escaped pattern, so it keeps "Sequential_#" as is
+_RUNTIME_SEQUENTIAL = re.compile(r'^Sequential_(\\d+)')
+_OPTIMIZER = re.compile(r'^Optimizer(?:[.#].*)?$')
+
+
+def _prettify_name(name: str, sequential: re.Pattern, sequential_repl: str) -> str:
+    if not isinstance(name, str):
+        return name
+    s = name
+    # ลบ "nn.Module:" แบบตรงไปตรงมา (ทั้งมี/ไม่มีช่องว่าง)
+    if 'nn.Module:' in s:
+        s = s.replace('nn.Module: ', '').replace('nn.Module:', '')
+    # เผื่อมีรูปแบบอื่นตกค้าง ให้ regex เก็บตกอีกชั้น
+    s = _MODULE_PREFIX.sub('', s)
+    # ลบ namespace บางตัวที่ยาว (aten::, autograd::, torch::)
+    s = _NAMESPACE_PREFIX.sub('', s)
+    # ย่อ Sequential_# -> Seq#
+    s = sequential.sub(sequential_repl, s)
+    # ตั้งชื่อ Optimizer ให้สั้นลงเป็นแค่ "Optimizer"
+    s = _OPTIMIZER.sub('Optimizer', s)
+    return s
+
+
+def _runtime_name(name: str) -> str:
+    return _prettify_name(name, _RUNTIME_SEQUENTIAL, r'Seq\\1')
+
+
+def _dag_name(name: str) -> str:
+    return _prettify_name(name, _SEQUENTIAL, r'Seq\1')
+
+
+def _prettify_names_inplace(obj, prettify: Callable[[str], str]):
+    if isinstance(obj, dict):
+        if isinstance(obj.get('name'), str):
+            obj['name'] = prettify(obj['name'])
+        for v in obj.values():
+            if isinstance(v, (dict, list)):
+                _prettify_names_inplace(v, prettify)
+    elif isinstance(obj, list):
+        for it in obj:
+            _prettify_names_inplace(it, prettify)
+
+
+def _collect_times(obj, starts, ends):
+    if isinstance(obj, dict):
+        st = obj.get('start_time')
+        et = obj.get('end_time')
+        if isinstance(st, (int, float)):
+            starts.append(st)
+        if isinstance(et, (int, float)):
+            ends.append(et)
+        for v in obj.values():
+            if isinstance(v, (dict, list)):
+                _collect_times(v, starts, ends)
+    elif isinstance(obj, list):
+        for it in obj:
+            _collect_times(it, starts, ends)
+
+
+def _normalize_step(step_obj):
+    """Normalize the times of one step in place to the 0..10 scale."""
+    starts, ends = [], []
+    _collect_times(step_obj, starts, ends)
+    if not starts or not ends:
+        return
+    min_start = min(starts)
+    span = max(ends) - min_start
+    if span <= 0:
+        return
+    scale = 10.0 / span
+
+    def apply_norm(obj):
+        if isinstance(obj, dict):
+            st = obj.get('start_time')
+            et = obj.get('end_time')
+            if isinstance(st, (int, float)):
+                obj['start_time'] = (st - min_start) * scale
+            if isinstance(et, (int, float)):
+                obj['end_time'] = (et - min_start) * scale
+            if 'start_time' in obj and 'end_time' in obj:
+                obj['dur'] = obj['end_time'] - obj['start_time']
+            for v in obj.values():
+                if isinstance(v, (dict, list)):
+                    apply_norm(v)
+        elif isinstance(obj, list):
+            for it in obj:
+                apply_norm(it)
+
+    apply_norm(step_obj)
+
+
+def runtime_step_view(step: Dict[str, Any]) -> Dict[str, Any]:
+    """The step with readable names and times normalized to 0..10. The input is not modified."""
+    content = copy.deepcopy(step)
+    _prettify_names_inplace(content, _runtime_name)
+    _normalize_step(content)
+    return content
+
+
+def projected_step_view(step: Dict[str, Any], fields: FrozenSet[str]) -> Dict[str, Any]:
+    """The step keeping only the fields of every node, e.g. name, start_time and end_time for the timings.
+    The children are kept, projected the same way, only when children is one of the fields.
+    The input is not modified."""
+    def copy_node(node):
+        return {k: v for k, v in node.items() if k in fields}
+
+    def project(node):
+        if not isinstance(node, dict):
+            return node
+        result = copy_node(node)
+        stack = [(node, result)]
+        while stack:
+            src, dst = stack.pop()
+            if isinstance(dst.get('children'), list):
+                dst['children'] = [copy_node(c) if isinstance(c, dict) else c for c in src['children']]
+                stack.extend((c, p) for c, p in zip(src['children'], dst['children']) if isinstance(c, dict))
+        return result
+
+    return {phase: [project(n) for n in value] if isinstance(value, list) else project(value)
+            for phase, value in step.items()}
+
+
+def _duration_of(ev: dict) -> float:
+    dur = ev.get('dur')
+    if isinstance(dur, (int, float)):
+        return float(dur)
+    st = ev.get('start_time', 0)
+    et = ev.get('end_time', 0)
+    if isinstance(st, (int, float)) and isinstance(et, (int, float)):
+        return float(et) - float(st)
+    return 0.0
+
+
+def _group_comm_interval(events: list):
+    # รวมช่วงเวลาเป็นก้อนเดียวจากกลุ่ม communication ที่ส่งมา
+    if not events:
+        return None
+    starts, ends = [], []
+    for ev in events:
+        st = ev.get('start_time')
+        et = ev.get('end_time')
+        if isinstance(st, (int, float)) and isinstance(et, (int, float)):
+            starts.append(float(st))
+            ends.append(float(et))
+    if not starts or not ends:
+        return None
+    st = min(starts)
+    et = max(ends)
+    return {
+        'start_time': st,
+        'end_time': et,
+        'dur': max(0.0, et - st),
+        'category': 'communication',
+    }
+
+
+def _collect_collectives(events: list, matcher: OperationMatcher, kind: str) -> list:
+    """The descendants of the events the matcher classifies as kind, in pre-order."""
+    found = []
+    for ev in events or []:
+        for ch in ev.get('children', []) or []:
+            if matcher.kind(ch.get('name')) == kind:
+                found.append(ch)
+        found.extend(_collect_collectives(ev.get('children', []), matcher, kind))
+    return found
+
+
+def _collective_label(events: List[dict], default_label: str) -> str:
+    # ชื่อจริงของ collective ในกลุ่ม (เช่น nccl:reduce_scatter) ไม่ซ้ำกัน ตามลำดับที่พบ
+    names = list(dict.fromkeys(ev['name'] for ev in events if isinstance(ev.get('name'), str)))
+    return ' + '.join(names) if names else default_label
+
+
+def _computation_node(nid: str, ev: dict, default_label: str) -> Dict[str, Any]:
+    return {
+        'id': nid,
+        'label': ev.get('name', default_label),
+        'category': 'computation',
+        'lane': 'top',
+        'start_time': ev.get('start_time'),
+        'end_time': ev.get('end_time'),
+        'dur': _duration_of(ev),
+    }
+
+
+def dag_step_view(step: Dict[str, Any], matcher: OperationMatcher = DEFAULT_MATCHER) -> Dict[str, Any]:
+    """
+    สร้างข้อมูล DAG ของ 1 step ตามกฎที่ผู้ใช้ระบุ
+    - matcher ของ run ใช้แยกชนิดของ collective (เช่น FSDP มี reduce_scatter เป็นชนิด allreduce)
+    - โหนดมี 2 ประเภท: computation (บน) และ communication (ล่าง)
+    - ใช้ dur เป็นตัวกำหนดสเกลขนาดเมื่อไปวาดด้านหน้า
+    - รวม broadcast ทั้ง step เป็นก้อนเดียว
+    - รวม children การสื่อสารของแต่ละ backward (เช่น nccl:all_reduce) เป็นก้อนเดียวต่อ backward
+      โดยใช้ชื่อ collective จริงเป็น label
+    - สร้างเส้นเชื่อม:
+      * โหนด computation → โหนด computation ถัดไป (start >= end ที่ใกล้ที่สุด)
+      * โหนด backward → โหนด all_reduce ที่ถูกรวมของมัน (ถ้ามี)
+      * ทุกโหนด communication → โหนด computation ถัดไป
+    ผลลัพธ์: { nodes: [ {id,label,category,lane,dur,start_time,end_time} ], edges: [ {source,target,kind} ] }
+    """
+    step = copy.deepcopy(step)
+    # แยก collective ด้วยชื่อเดิมก่อนทำให้ชื่อสั้นลง; โหนดเป็นตัวเดียวกับใน step จึงถูก normalize ไปด้วย
+    backward_comms = [_collect_collectives([ev], matcher, 'allreduce') for ev in step.get('backward', []) or []]
+    backward_labels = [_collective_label(events, 'nccl:all_reduce') for events in backward_comms]
+    bcast_label = _collective_label(step.get('broadcasts', []) or [], 'nccl:broadcast')
+    _prettify_names_inplace(step, _dag_name)
+    # normalize ก่อน (เพื่อให้ dur เป็นสเกลเดียวกับ runtime)
+    _normalize_step(step)
+
+    nodes = []
+    edges = []
+    id_seq = 0
+
+    def next_id(prefix: str) -> str:
+        nonlocal id_seq
+        id_seq += 1
+        return f"{prefix}_{id_seq}"
+
+    # เตรียมลิสต์โครงสร้างหลักสำหรับลิงก์ที่ชัดเจน
+    forwards_src = step.get('forward', []) or []
+    backward_list = step.get('backward', []) or []
+    loss = step.get('loss') if isinstance(step.get('loss'), dict) else None
+    opt = step.get('optimizer') if isinstance(step.get('optimizer'), dict) else None
+
+    # --- Computation: forward ---
+    forward_ids = []
+    for ev in forwards_src:
+        nid = next_id('comp')
+        nodes.append(_computation_node(nid, ev, 'forward'))
+        forward_ids.append(nid)
+
+    # --- Computation: loss ---
+    loss_id = None
+    if loss:
+        loss_id = next_id('comp')
+        nodes.append(_computation_node(loss_id, loss, 'loss'))
+
+    # --- Computation: backward (และสกัด communication ของมัน) ---
+    backward_id_to_comm_id = {}
+    backward_ids = []
+    for ev, comms, label in zip(backward_list, backward_comms, backward_labels):
+        nid = next_id('comp')
+        nodes.append(_computation_node(nid, ev, 'backward'))
+        backward_ids.append(nid)
+
+        # group the allreduce children (all_reduce, reduce_scatter, ...) for this backward
+        grouped = _group_comm_interval(comms)
+        if grouped:
+            cid = next_id('comm')
+            nodes.append({
+                'id': cid,
+                'label': label,
+                'category': 'communication',
+                'lane': 'bottom',
+                **grouped,
+            })
+            # edge: backward -> its all_reduce
+            edges.append({'source': nid, 'target': cid, 'kind': 'backward_to_allreduce'})
+            backward_id_to_comm_id[nid] = cid
+
+    # --- Computation: optimizer ---
+    optimizer_id = None
+    if opt:
+        optimizer_id = next_id('comp')
+        nodes.append(_computation_node(optimizer_id, opt, 'optimizer'))
+
+    # --- Communication: broadcasts (รวมทั้ง step เป็นก้อนเดียว) ---
+    bcast_group = _group_comm_interval(step.get('broadcasts', []) or [])
+    bcast_id = None
+    if bcast_group:
+        bcast_id = next_id('comm')
+        nodes.append({
+            'id': bcast_id,
+            'label': bcast_label,
+            'category': 'communication',
+            'lane': 'bottom',
+            **bcast_group,
+        })
+
+    # --- เชื่อมโยงตามกฎที่กำหนด ---
+    # 1) broadcast -> forward ตัวแรก
+    if bcast_id and forward_ids:
+        edges.append({'source': bcast_id, 'target': forward_ids[0], 'kind': 'bcast_to_first_forward'})
+
+    # 2) chain forwards
+    for i in range(len(forward_ids) - 1):
+        edges.append({'source': forward_ids[i], 'target': forward_ids[i + 1], 'kind': 'seq'})
+
+    # 3) last forward -> loss (ถ้ามี)
+    if loss_id and forward_ids:
+        edges.append({'source': forward_ids[-1], 'target': loss_id, 'kind': 'seq'})
+
+    # 4) loss -> backward แรก
+    if loss_id and backward_ids:
+        edges.append({'source': loss_id, 'target': backward_ids[0], 'kind': 'seq'})
+
+    # backward -> (all_reduce ถ้ามี) -> backward ถัดไป; ถ้าไม่มีถัดไปให้วิ่งไป optimizer
+    for i, bid in enumerate(backward_ids):
+        comm_id = backward_id_to_comm_id.get(bid)
+        next_b = backward_ids[i + 1] if i + 1 < len(backward_ids) else None
+        if comm_id:
+            edges.append({'source': bid, 'target': comm_id, 'kind': 'backward_to_allreduce'})
+            if next_b:
+                edges.append({'source': comm_id, 'target': next_b, 'kind': 'allreduce_to_next_backward'})
+            elif optimizer_id:
+                edges.append({'source': comm_id, 'target': optimizer_id, 'kind': 'allreduce_to_optimizer'})
+        else:
+            if next_b:
+                edges.append({'source': bid, 'target': next_b, 'kind': 'seq'})
+            elif optimizer_id:
+                edges.append({'source': bid, 'target': optimizer_id, 'kind': 'to_optimizer'})
+
+    # ถ้าไม่มี backward แต่มี loss และ optimizer ให้ต่อ loss -> optimizer
+    if loss_id and not backward_ids and optimizer_id:
+        edges.append({'source': loss_id, 'target': optimizer_id, 'kind': 'seq'})
+
+    return {'nodes': nodes, 'edges': edges}
@@ -8,6 +8,13 @@ setup(
     package_data={
         "cgs_dnn_analysis": ["static/**"],
     },
+    # optional speedups: a faster json codec (orjson or ujson) and the br Content-Encoding (brotli)
+    extras_require={
+        "orjson": ["orjson"],
+        "ujson": ["ujson"],
+        "brotli": ["brotli"],
+        "speedups": ["orjson", "brotli"],
+    },
     entry_points={
         "tensorboard_plugins": [
             "cgs-dnn-analysis = cgs_dnn_analysis.plugin:CGSDNNAnalysisPlugin",